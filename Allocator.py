@@ -1,3 +1,4 @@
+import math
 import logging
 
 from Device import Device
@@ -62,6 +63,48 @@ class Allocator:
             device_to_online = self.offline_devices[0]  # pick some device
             self.online_device(device_to_online)
 
+    def steps_until_event(self) -> int|float:
+        """
+        Number of upcoming steps before any device is brought online or offline.
+        """
+        if self.offline_devices and self.idle_threshold >= 0:
+            if self.global_scheduler.all_devices_busy:
+                return 0
+            # Running decode batches keep growing the workload, which may turn every device busy
+            if all(
+                d.workload > 1.5 or (d.tag != Device.Mode.PREFILL and d.scheduler.num_jobs > 0)
+                for d in self.global_scheduler.devices
+            ):
+                return 0
+        if self.idle_threshold == -1:
+            return math.inf
+
+        steps = math.inf
+        for device in self.online_devices:
+            if device.is_warming_up or device.workload >= 1e-6:
+                continue
+            remaining = self.idle_threshold - self.idle_counters[device] - 1
+            if remaining < 0:
+                # Idle counter already expired, the device stays only if it is not okay to offline.
+                if self._okay_to_offline(device):
+                    return 0
+                continue
+            steps = min(steps, remaining)
+        return steps
+
+    def fast_forward(self, steps: int) -> None:
+        """
+        Apply the bookkeeping of `steps` quiet steps at once.
+        """
+        for device in self.online_devices:
+            self.working_counters[device] += steps
+            if device.is_warming_up or self.idle_threshold == -1:
+                continue
+            if device.workload < 1e-6:
+                self.idle_counters[device] += steps
+            else:
+                self.idle_counters[device] = 0
+
     def offline_device(self, device) -> None:
         """
         Take 'device' offline. Remove it from the GlobalScheduler and from the online list.
@@ -0,0 +1,114 @@
+import heapq
+from abc import abstractmethod
+
+
+class Clock:
+    """
+    Interface of the simulation clock (the `env` carried by every component).
+    It is the subset of simpy.Environment used by the simulator:
+      - now: current simulation time.
+      - timeout(delay): value to yield from a simulation process to advance its time by `delay`.
+      - process(generator): register a simulation process.
+      - run(until): run the registered processes until they are done or `until` is reached.
+    """
+
+    @property
+    @abstractmethod
+    def now(self):
+        raise NotImplementedError("Subclasses must implement this property.")
+
+    @abstractmethod
+    def timeout(self, delay):
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    @abstractmethod
+    def process(self, generator):
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    @abstractmethod
+    def run(self, until=None):
+        raise NotImplementedError("Subclasses must implement this method.")
+
+
+class StepClock(Clock):
+    """
+    Lightweight clock driving processes with a plain integer loop (the default engine).
+    - Processes yield the delay returned by timeout().
+    - A single process runs without any event queue, several processes are interleaved by wake-up time.
+    - Like SimPy, run(until) stops before the events scheduled at `until`, and a later run() resumes them.
+    """
+
+    def __init__(self, initial_time=0):
+        self._now = initial_time
+        self._queue: list[tuple] = []  # (wake-up time, scheduling order, process)
+        self._count = 0
+
+    @property
+    def now(self):
+        return self._now
+
+    def timeout(self, delay):
+        if delay < 0:
+            raise ValueError(f"Negative delay {delay}")
+        return delay
+
+    def process(self, generator):
+        self._schedule(self._now, generator)
+        return generator
+
+    def _schedule(self, wake_time, process):
+        heapq.heappush(self._queue, (wake_time, self._count, process))
+        self._count += 1
+
+    def run(self, until=None):
+        while self._queue:
+            wake_time, order, process = heapq.heappop(self._queue)
+            if until is not None and wake_time >= until:
+                heapq.heappush(self._queue, (wake_time, order, process))
+                break
+            self._now = wake_time
+
+            # Fast path: a lonely process is driven without touching the queue
+            if not self._queue:
+                for delay in process:
+                    if until is not None and self._now + delay >= until:
+                        self._schedule(self._now + delay, process)
+                        break
+                    self._now += delay
+                continue
+
+            delay = next(process, None)
+            if delay is not None:
+                self._schedule(self._now + delay, process)
+
+        if until is not None:
+            self._now = until
+
+    def __str__(self):
+        return f"StepClock: t={self._now}"
+
+
+class SimPyClock(Clock):
+    """
+    Adapter running the simulation on a SimPy environment, for compatibility with SimPy processes.
+    """
+
+    def __init__(self, initial_time=0):
+        import simpy
+        self.env = simpy.Environment(initial_time)
+
+    @property
+    def now(self):
+        return self.env.now
+
+    def timeout(self, delay):
+        return self.env.timeout(delay)
+
+    def process(self, generator):
+        return self.env.process(generator)
+
+    def run(self, until=None):
+        return self.env.run(until)
+
+    def __str__(self):
+        return f"SimPyClock: t={self.env.now}"
@@ -1,8 +1,12 @@
+import math
 import logging
 from enum import Enum
 
 from Memory import Memory
+from PagedMemory import PagedMemory
+from HostMemory import HostMemory
 from Job import Job
+from StepCost import StepCost
 
 
 class Device:
@@ -10,12 +14,24 @@ class Device:
     Represents a device with its own memory and scheduler.
 
     Parameters:
-      - env: SimPy environment.
+      - env: Simulation clock (see Clock.py).
       - memory_capacity: Total memory capacity for the device.
+      - memory_kwargs: Additional keyword arguments for the memory (e.g., threshold).
+        A `block_size` (in tokens) selects a PagedMemory instead of a plain token counter.
+      - host_memory_capacity: Capacity of the optional host memory tier holding swapped jobs (None for no tier).
+      - host_memory_kwargs: Keyword arguments of the host memory tier, e.g., its link `bandwidth` in tokens per step.
       - scheduler_cls: The Scheduler class to use (e.g., FCFSScheduler, RRScheduler, etc.).
       - scheduler_kwargs: Additional keyword arguments for the scheduler.
       - name: Name of the device (for easy debugging).
       - tag: Operational mode of the device (e.g., Prefill, Decode, Mixed).
+      - step_cost: Duration model of a step (see StepCost), every step takes one time unit by default.
+
+    With a step cost, the device runs on its own fractional clock: a step lasting 3.4 time units keeps
+    the device busy for the next simulation steps, and its next step starts at the fraction it left off.
+    Jobs finishing in a step are stamped with the last simulation step the device is busy with it.
+
+    The global scheduler indexes the devices by workload: a device notifies it whenever its queue or memory
+    may have changed (a new job, a step, quiet steps), see GlobalScheduler.update_workload.
     """
     class Mode(Enum):
         """
@@ -27,14 +43,25 @@ class Device:
 
     WARM_UP_TIME = 10
 
-    def __init__(self, env, memory_capacity,memory_kwargs, scheduler_cls, scheduler_kwargs, name="Device", tag=Mode.DECODE):
+    def __init__(self, env, memory_capacity,memory_kwargs, scheduler_cls, scheduler_kwargs, name="Device", tag=Mode.DECODE,
+                 host_memory_capacity=None, host_memory_kwargs=None, step_cost: StepCost|None = None):
         self.env = env
         self.name = name
         self.tag = tag
-        self.memory = Memory(env, capacity=memory_capacity, **memory_kwargs)
+        memory_cls = PagedMemory if "block_size" in memory_kwargs else Memory
+        self.memory = memory_cls(env, capacity=memory_capacity, **memory_kwargs)
+        self.host_memory: HostMemory|None = None
+        if host_memory_capacity is not None:
+            self.host_memory = HostMemory(env, capacity=host_memory_capacity, **(host_memory_kwargs or {}))
         self.scheduler = scheduler_cls(env, device=self, memory=self.memory, **scheduler_kwargs)
         self.global_scheduler = None
         self.warm_up_remaining = 0
+        self.step_cost: StepCost = step_cost if step_cost is not None else StepCost()
+        # Fractional time the current step ends at
+        self.busy_until = 0.0
+        # Statistics
+        self.busy_time = 0.0
+        self.work_steps = 0
 
     def set_global_scheduler(self, global_scheduler):
         self.global_scheduler = global_scheduler
@@ -49,7 +76,10 @@ class Device:
 
         if not self.job_state_supported(job):
             return False
-        return self.scheduler.add_job(job)
+        if not self.scheduler.add_job(job):
+            return False
+        self._update_workload()
+        return True
 
     def step(self) -> list[Job]:
         """
@@ -61,7 +91,58 @@ class Device:
             self.warm_up_remaining -= 1
             return []
 
-        return self.scheduler.step()
+        now = self.env.now
+        if self.busy_until > now:
+            logging.debug(f"{self.name} >> Busy until {self.busy_until:.2f}...")
+            self.scheduler.wait(now, 1)
+            return []
+
+        # A step following a busy period starts when the previous one ended
+        start = self.busy_until if self.busy_until > now - 1 else now
+        jobs = self.scheduler.step()
+        work = self.scheduler.step_work(jobs)
+        duration = self.step_cost.cost(work)
+        self.busy_until = start + duration
+        if not work.is_empty:
+            self.busy_time += duration
+            self.work_steps += 1
+
+        # The jobs finishing in this step are done when the step ends
+        end = math.ceil(self.busy_until) - 1
+        if end > now:
+            for job in jobs:
+                if job.state == Job.State.DECODE and job.decode_finish_time == now:
+                    job.decode_finish_time = end
+        self._update_workload()
+        return jobs
+
+    def steps_until_event(self) -> int|float:
+        """
+        Number of upcoming steps in which this device only counts down or keeps running unchanged.
+        """
+        # The step that completes the warm-up makes the device available again.
+        if self.is_warming_up:
+            return self.warm_up_remaining - 1
+        # The steps until the current step ends are quiet
+        if self.busy_until > self.env.now + 1:
+            return math.ceil(self.busy_until) - self.env.now - 1
+        steps = self.scheduler.steps_until_event()
+        # Every step lasts its own cost, only idle schedulers are fast-forwarded
+        if not self.step_cost.is_unit and steps != math.inf:
+            return 0
+        return steps
+
+    def fast_forward(self, steps: int) -> None:
+        """
+        Apply `steps` quiet steps at once.
+        """
+        if self.is_warming_up:
+            self.warm_up_remaining -= steps
+        elif self.busy_until > self.env.now + 1:
+            self.scheduler.wait(self.env.now + 1, steps)
+        else:
+            self.scheduler.fast_forward(steps)
+            self._update_workload()
 
     @property
     def workload(self) -> int:
@@ -71,6 +152,13 @@ class Device:
         """
         return 0.02 * self.scheduler.num_jobs + 1.0 * (self.memory.occupied_tokens / self.memory.safe_capacity)
 
+    def _update_workload(self) -> None:
+        """
+        Let the global scheduler re-index this device.
+        """
+        if self.global_scheduler is not None:
+            self.global_scheduler.update_workload(self)
+
     def warm_up(self):
         """
         Warm up the device.
@@ -98,4 +186,9 @@ class Device:
         return False
 
     def __str__(self):
-        return f"{self.name} ({self.tag.value})\n\t{self.scheduler}\n\t{self.memory}"
+        s = f"{self.name} ({self.tag.value})\n\t{self.scheduler}\n\t{self.memory}"
+        if self.host_memory is not None:
+            s += f"\n\t{self.host_memory}"
+        if not self.step_cost.is_unit:
+            s += f"\n\t{self.step_cost}: {self.work_steps} steps in {self.busy_time:.1f} time units"
+        return s
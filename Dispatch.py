@@ -0,0 +1,346 @@
+import logging
+import math
+import time
+from bisect import bisect_left, insort
+
+import numpy as np
+
+from Device import Device
+from Job import Job
+
+
+def print_devices(devices: list[Device]) -> str:
+    msg = "Devices:\t"
+    for d in devices:
+        msg += f"{d.name}({d.tag}) {d.workload:.4f}\t"
+    return msg
+
+
+class DispatchPolicy:
+    """
+    Chooses the device of the jobs queued in the global scheduler, at every step.
+    By default, every job, in arrival order, goes to the least loaded capable device (see Device.workload),
+    which queues it even if its memory cannot hold it yet.
+
+    The policy counts its decisions. With `profile`, it also measures its overhead, the devices it looked at (probes)
+    and the time spent dispatching, to compare the policies on large clusters.
+    """
+    name = "Least loaded"
+
+    def __init__(self, profile: bool = False):
+        """
+        :param profile: Measure the probes and the time spent per decision.
+        """
+        self.profile = profile
+        # Statistics
+        self.decisions = 0
+        self.probes = 0
+        self.dispatch_time = 0.0
+
+    def dispatch(self, scheduler, jobs: list[Job]) -> list[Job]:
+        """
+        Assign the queued jobs of a step to the devices of `scheduler` (a GlobalScheduler).
+        :return: The jobs left queued, in arrival order.
+        """
+        if not self.profile:
+            return self._dispatch(scheduler, jobs)
+        start = time.perf_counter()
+        queued = self._dispatch(scheduler, jobs)
+        self.dispatch_time += time.perf_counter() - start
+        return queued
+
+    def _dispatch(self, scheduler, jobs: list[Job]) -> list[Job]:
+        """
+        Dispatch the jobs one by one, in arrival order.
+        """
+        queued = []
+        for job in jobs:
+            if not self.dispatch_job(scheduler, job):
+                queued.append(job)
+        return queued
+
+    def dispatch_job(self, scheduler, job: Job) -> bool:
+        """
+        Try the candidate devices of a job in order, until one accepts it.
+        :return: True if the job was dispatched.
+        """
+        self.decisions += 1
+        for device in self.candidates(scheduler, job):
+            if scheduler.assign(job, device):
+                return True
+        logging.warning(f"G-S >> No capable device found for Job({job.job_id})")
+        return False
+
+    def candidates(self, scheduler, job: Job):
+        """
+        The capable devices to try for a job, in order of preference, lazily.
+        By default, the least loaded first, from the workload index of the global scheduler.
+        """
+        modes = scheduler.capable_modes(job)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"G-S >> Capable {print_devices(list(scheduler.by_workload(modes)))}")
+        if self.profile:
+            return self._probed(scheduler.by_workload(modes))
+        return scheduler.by_workload(modes)
+
+    def _probed(self, devices):
+        """
+        Count the devices tried as probes.
+        """
+        for device in devices:
+            self.probes += 1
+            yield device
+
+    def is_blocked(self, scheduler, jobs: list[Job]) -> bool:
+        """
+        Whether none of the queued jobs can be dispatched before the next device event (see steps_until_event).
+        """
+        return False
+
+    def __str__(self):
+        s = f"{self.name} dispatch: {self.decisions} decisions"
+        if self.profile and self.decisions > 0:
+            s += (
+                f", {self.probes / self.decisions:.2f} probes and "
+                f"{1e6 * self.dispatch_time / self.decisions:.2f} us per decision "
+                f"({1e3 * self.dispatch_time:.1f} ms in total)"
+            )
+        return s
+
+
+class JoinShortestQueue(DispatchPolicy):
+    """
+    Join-the-shortest-queue: every job goes to the capable device running the fewest jobs, ties to the first added.
+    Every decision looks at all the capable devices.
+    """
+    name = "Join shortest queue"
+
+    def candidates(self, scheduler, job: Job):
+        """
+        Override the candidates method: the shortest queue first, then the others only if it refuses the job.
+        """
+        devices = [d for mode in scheduler.capable_modes(job) for d in scheduler.devices_by_mode[mode]]
+        self.probes += len(devices)
+        if not devices:
+            return
+        key = lambda d: (d.scheduler.num_jobs, scheduler.rank(d))
+        shortest = min(devices, key=key)
+        yield shortest
+        yield from sorted((d for d in devices if d is not shortest), key=key)
+
+
+class PowerOfChoices(DispatchPolicy):
+    """
+    Power-of-d-choices: every job samples `choices` capable devices at random, and joins the shortest queue among them.
+    Every decision looks at `choices` devices whatever the cluster size.
+    If none of the sampled devices accepts the job (e.g., warming up), the least loaded device is tried next.
+    """
+    name = "Power of choices"
+
+    def __init__(self, choices: int = 2, seed: int|None = 0, profile: bool = False):
+        """
+        :param choices: Number of devices sampled per job.
+        :param seed: Seed of the sampling random stream, None for fresh entropy.
+        :param profile: Measure the probes and the time spent per decision.
+        """
+        super().__init__(profile)
+        if choices < 1:
+            raise ValueError("Power of choices needs at least one choice.")
+        self.choices = choices
+        self.name = f"Power of {choices} choices"
+        self.rng = np.random.default_rng(seed)
+
+    def candidates(self, scheduler, job: Job):
+        """
+        Override the candidates method: the shortest sampled queue first, the least loaded devices as a fallback.
+        """
+        groups = [scheduler.devices_by_mode[mode] for mode in scheduler.capable_modes(job)]
+        total = sum(len(group) for group in groups)
+        if total == 0:
+            return
+        # Distinct draws by rejection, cheaper than a sample without replacement when d << D
+        picks: dict[int, None] = {}
+        while len(picks) < min(self.choices, total):
+            picks[int(self.rng.integers(total))] = None
+        sampled = [_nth(groups, i) for i in picks]
+        self.probes += len(sampled)
+        yield from sorted(sampled, key=lambda d: (d.scheduler.num_jobs, scheduler.rank(d)))
+        yield from (d for d in super().candidates(scheduler, job) if d not in sampled)
+
+
+class RoundRobin(DispatchPolicy):
+    """
+    Round-robin: the jobs of a kind go to the capable devices in turn, whatever their load.
+    Every decision looks at one device, unless it refuses the job.
+    """
+    name = "Round robin"
+
+    def __init__(self, profile: bool = False):
+        super().__init__(profile)
+        self._turns: dict[tuple, int] = {}  # Capable modes -> next device in their concatenated device lists
+
+    def candidates(self, scheduler, job: Job):
+        """
+        Override the candidates method: the devices in turn, starting after the last one chosen.
+        """
+        modes = tuple(scheduler.capable_modes(job))
+        groups = [scheduler.devices_by_mode[mode] for mode in modes]
+        total = sum(len(group) for group in groups)
+        start = self._turns.get(modes, 0)
+        for offset in range(total):
+            self.probes += 1
+            self._turns[modes] = (start + offset + 1) % total
+            yield _nth(groups, (start + offset) % total)
+
+
+class HeadroomPolicy(DispatchPolicy):
+    """
+    Base of the policies routing the jobs by the memory headroom of the devices (see Scheduler.headroom):
+    a job only goes to a device whose safe capacity still holds it on top of the expected memory of its run queue.
+    - The headroom of the devices is kept in a sorted list per mode during a dispatch,
+      so that placing a job costs a binary search.
+    - Jobs fitting nowhere stay queued, and wait for a device to free memory.
+    - A job larger than every capable device is dispatched to the least loaded one, as it would never fit.
+    """
+    def _dispatch(self, scheduler, jobs: list[Job]) -> list[Job]:
+        """
+        Override the _dispatch method: place the jobs that fit, in the order given by _order.
+        """
+        rooms = self._rooms(scheduler)
+        fitting, oversized = self._placeable_jobs(scheduler, jobs, rooms)
+        placed = {job for job in oversized if self.dispatch_job(scheduler, job)}
+        for job, size, modes in self._order(fitting):
+            self.decisions += 1
+            best = None
+            for mode in modes:
+                room = rooms[mode]
+                self.probes += 1
+                i = self._pick(room, size)
+                if i is not None and (best is None or self._better(room[i], best[0])):
+                    best = (room[i], mode, i)
+            # The room went to the jobs placed before
+            if best is None:
+                continue
+            (headroom, rank, device), mode, i = best
+            del rooms[mode][i]
+            if scheduler.assign(job, device):
+                placed.add(job)
+                insort(rooms[mode], (headroom - size, rank, device))
+        if len(placed) < len(jobs):
+            logging.debug(f"G-S >> {len(jobs) - len(placed)} jobs waiting for device memory")
+        return [job for job in jobs if job not in placed]
+
+    def _order(self, fitting: list[tuple]) -> list[tuple]:
+        """
+        The order to place the fitting (job, size, capable modes), arrival order by default.
+        """
+        return fitting
+
+    def _pick(self, room: list[tuple], size: int) -> int|None:
+        """
+        Index of the device of a sorted headroom list to place a job of `size` tokens on, None if it fits nowhere.
+        """
+        raise NotImplementedError("Subclasses should implement _pick()")
+
+    def _better(self, entry: tuple, best: tuple) -> bool:
+        """
+        Whether the headroom entry of a mode beats the best entry of the other modes.
+        """
+        raise NotImplementedError("Subclasses should implement _better()")
+
+    def is_blocked(self, scheduler, jobs: list[Job]) -> bool:
+        """
+        Override the is_blocked method: the headroom of a device only grows in the step of a device event.
+        """
+        return not any(self._placeable_jobs(scheduler, jobs, self._rooms(scheduler)))
+
+    @staticmethod
+    def _rooms(scheduler) -> dict[Device.Mode, list[tuple]]:
+        """
+        The memory headroom of the devices accepting jobs, as sorted (headroom, rank, device) per mode.
+        """
+        return {
+            mode: sorted((d.scheduler.headroom, scheduler.rank(d), d) for d in devices if not d.is_warming_up)
+            for mode, devices in scheduler.devices_by_mode.items()
+        }
+
+    @staticmethod
+    def _placeable_jobs(scheduler, jobs: list[Job], rooms: dict[Device.Mode, list[tuple]]) -> tuple[list[tuple], list[Job]]:
+        """
+        Split out the jobs that fit in the headroom of a capable device, and the ones larger than every capable device.
+        The sizes are compared at once per job state, against the largest headroom and safe capacity of its devices.
+        :return: ((job, size, capable modes) of the fitting jobs, oversized jobs), in arrival order.
+        """
+        states = np.fromiter((job.state.value for job in jobs), dtype=np.int64, count=len(jobs))
+        sizes = np.fromiter((job.init_size for job in jobs), dtype=np.int64, count=len(jobs))
+        fitting, oversized = [], []
+        for state in np.unique(states):
+            same_state = states == state
+            modes = scheduler.capable_modes(jobs[int(np.argmax(same_state))])
+            largest_room = max((rooms[mode][-1][0] for mode in modes if rooms[mode]), default=-math.inf)
+            largest_capacity = max((d.memory.safe_capacity for mode in modes for d in scheduler.devices_by_mode[mode]), default=0)
+            fitting += ((i, modes) for i in np.flatnonzero(same_state & (sizes <= largest_room)).tolist())
+            oversized += np.flatnonzero(same_state & (sizes > largest_capacity)).tolist()
+        fitting.sort()
+        oversized.sort()
+        return [(jobs[i], sizes.item(i), modes) for i, modes in fitting], [jobs[i] for i in oversized]
+
+
+class MostHeadroom(HeadroomPolicy):
+    """
+    Memory-headroom routing: every job, in arrival order, goes to the capable device with the most headroom
+    (worst fit), ties to the first added.
+    """
+    name = "Most headroom"
+
+    def _pick(self, room: list[tuple], size: int) -> int|None:
+        """
+        Override the _pick method: the device with the most headroom, the first added among equal ones.
+        """
+        if room and room[-1][0] >= size:
+            return bisect_left(room, (room[-1][0],))
+        return None
+
+    def _better(self, entry: tuple, best: tuple) -> bool:
+        """
+        Override the _better method: more headroom wins, then the first added.
+        """
+        return (entry[0], -entry[1]) > (best[0], -best[1])
+
+
+class BestFit(HeadroomPolicy):
+    """
+    Bin packing (best fit decreasing): the largest jobs first, each to the capable device it leaves the least
+    headroom on, ties to the first added.
+    """
+    name = "Best fit"
+
+    def _order(self, fitting: list[tuple]) -> list[tuple]:
+        """
+        Override the _order method: the largest jobs first.
+        """
+        return sorted(fitting, key=lambda f: f[1], reverse=True)
+
+    def _pick(self, room: list[tuple], size: int) -> int|None:
+        """
+        Override the _pick method: the device with the least headroom that holds the job.
+        """
+        i = bisect_left(room, (size,))
+        return i if i < len(room) else None
+
+    def _better(self, entry: tuple, best: tuple) -> bool:
+        """
+        Override the _better method: less headroom wins, then the first added.
+        """
+        return entry < best
+
+
+def _nth(groups: list[list], index: int):
+    """
+    The item at `index` of the concatenation of `groups`.
+    """
+    for group in groups:
+        if index < len(group):
+            return group[index]
+        index -= len(group)
+    raise IndexError(index)
@@ -1,7 +1,9 @@
-import random
+import math
 import logging
 from abc import abstractmethod
 
+import numpy as np
+
 from Schedulers.GlobalScheduler import GlobalScheduler
 
 
@@ -13,15 +15,23 @@ class Generator:
     - total: total number of jobs to generate (stop after X).
     - dropout: probability to drop a job (simulate uncertain server load).
     - name: name of the generator (for debugging).
+    - seed: seed of the random streams, the same seed always produces the same job sequence.
+    - prefix_fn: optional function drawing the shared prompt prefix of a job, called with the prefix random stream
+      and the job's initial size, returns (prefix id, prefix size) or None for a job without a shared prefix.
+
+    The generator owns independent random streams for dropout, job sizes and prefixes, so every simulation
+    using the same seed sees exactly the same jobs whatever the schedulers do (common random numbers).
+    Arrivals follow the deterministic `speed` accumulator and need no stream.
     """
 
-    def __init__(self, env, scheduler: GlobalScheduler, speed: float, total: int, dropout: float = 0.0, name: str = "Base Generator"):
+    def __init__(self, env, scheduler: GlobalScheduler, speed: float, total: int, dropout: float = 0.0, name: str = "Base Generator", seed: int|None = None, prefix_fn=None):
         self.env = env
         self.name = name
         self.scheduler = scheduler
         self.speed = speed  # This value may be fractional.
         self.total_limit = total
         self.dropout = dropout
+        self.prefix_fn = prefix_fn
 
         self.job_id = 1
         self.generated_count = 0
@@ -29,6 +39,14 @@ class Generator:
         # Accumulator for fractional job generation.
         self._acc = 0.0
 
+        # Random streams, a None seed draws fresh entropy (kept in self.seed to reproduce the run)
+        seed_sequence = np.random.SeedSequence(seed)
+        self.seed = seed_sequence.entropy
+        dropout_seed, size_seed, prefix_seed = seed_sequence.spawn(3)
+        self.dropout_rng = np.random.default_rng(dropout_seed)
+        self.size_rng = np.random.default_rng(size_seed)
+        self.prefix_rng = np.random.default_rng(prefix_seed)
+
 
     def generate_jobs(self) -> int:
         """
@@ -50,7 +68,7 @@ class Generator:
                 break
 
             # Randomly drop jobs to simulate uncertain server loads
-            if random.random() < self.dropout:
+            if self.dropout_rng.random() < self.dropout:
                 continue
 
             # Let the concrete generator try to add a job
@@ -65,6 +83,41 @@ class Generator:
             logging.debug(f"Generator >> Generated {tmp_cnt} jobs this step.")
         return tmp_cnt
 
+    def steps_until_event(self) -> int|float:
+        """
+        Number of upcoming steps in which no job will arrive.
+        The accumulator is replayed exactly so that skipping matches the per-step float additions.
+        """
+        if self.is_finished or self.speed <= 0:
+            return math.inf
+        acc = self._acc
+        steps = 0
+        while True:
+            acc += self.speed
+            if int(acc) >= 1:
+                return steps
+            steps += 1
+
+    def fast_forward(self, steps: int) -> None:
+        """
+        Apply `steps` arrival-free steps at once.
+        """
+        for _ in range(steps):
+            self._acc += self.speed
+            self._acc -= int(self._acc)
+
+    def draw_prefix(self, init_size: int) -> tuple[int|None, int]:
+        """
+        Draw the shared prompt prefix of a new job with prefix_fn.
+        :return: (prefix id, prefix size), (None, 0) for a job without a shared prefix.
+        """
+        if self.prefix_fn is None:
+            return None, 0
+        prefix = self.prefix_fn(self.prefix_rng, init_size)
+        if prefix is None:
+            return None, 0
+        return prefix
+
     @abstractmethod
     def try_add_one_job(self) -> bool:
         """
@@ -84,7 +137,7 @@ class Generator:
             string += f"~1 job per {period} steps, "
         else:
             string += f"{self.speed} jobs per step, "
-        string += f"{self.dropout:.2f} dropout, "
+        string += f"{self.dropout:.2f} dropout, seed {self.seed}, "
         string += f"{self.generated_count}/{self.total_limit} jobs generated."
         return string
 
@@ -1,5 +1,6 @@
 import csv
 import logging
+import os
 from dataclasses import dataclass, field
 from typing import List, Dict
 from Generators.BaseGenerator import Generator
@@ -29,15 +30,44 @@ class CSVSource:
     target_count: int = 0  # Number of jobs to generate from this source
     current_index: int = 0  # Pointer to the next row to use
 
+    def __getstate__(self):
+        """
+        Do not serialize the rows (e.g., in simulation snapshots), they are reloaded from the trace file.
+        """
+        state = self.__dict__.copy()
+        state["rows"] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.target_count > 0:
+            self.load_rows()
+
     def load_rows(self):
-        """Load CSV rows from file using DictReader."""
+        """Load CSV rows from file (or from the trace cache) using DictReader."""
+        self.rows = load_trace(self.file_path)
+
+
+# Parsed CSV rows by absolute file path, shared (read-only) by every CSVSource of the process.
+# Loading the traces before forking worker processes lets them share the rows copy-on-write.
+_TRACE_CACHE: Dict[str, List[Dict]] = {}
+
+
+def load_trace(file_path: str) -> List[Dict]:
+    """
+    Load the rows of a CSV trace once per process.
+    The returned list is shared, callers must not modify it.
+    """
+    key = os.path.abspath(file_path)
+    if key not in _TRACE_CACHE:
         try:
-            with open(self.file_path, newline="") as f:
+            with open(file_path, newline="") as f:
                 reader = csv.DictReader(f)
-                self.rows = list(reader)
+                _TRACE_CACHE[key] = list(reader)
         except Exception as e:
-            logging.error(f"Failed to read CSV file {self.file_path}: {e}")
+            logging.error(f"Failed to read CSV file {file_path}: {e}")
             raise
+    return _TRACE_CACHE[key]
 
 
 class CSVGenerator(Generator):
@@ -45,13 +75,14 @@ class CSVGenerator(Generator):
     Generator that creates new Jobs based on multiple CSV files.
 
     The total number of jobs to generate is provided by the user.
+    The traces carry no prefix information, shared prompt prefixes can be drawn with prefix_fn (see Generator).
     The loader will generate jobs from multiple CSV sources sequentially until its fraction is exhausted.
     For each CSV source, the target number of jobs is computed from its fraction (with the last source
     receiving the remainder).
     """
 
-    def __init__(self, env, scheduler, speed, total, dropout, csv_sources: List[CSVSource]):
-        super().__init__(env, scheduler, speed, total, dropout, name="MultiCSV Generator")
+    def __init__(self, env, scheduler, speed, total, dropout, csv_sources: List[CSVSource], seed=None, prefix_fn=None):
+        super().__init__(env, scheduler, speed, total, dropout, name="MultiCSV Generator", seed=seed, prefix_fn=prefix_fn)
         self.csv_sources = csv_sources
 
         # Check that the sum of fractions is 1.
@@ -120,10 +151,13 @@ class CSVGenerator(Generator):
             return False
 
         arrival_time = self.env.now
+        prefix_id, prefix_size = self.draw_prefix(init_size)
         job = Job(job_id=self.job_id,
                   arrival_time=arrival_time,
                   init_size=init_size,
-                  expected_output=expected_output)
+                  expected_output=expected_output,
+                  prefix_id=prefix_id,
+                  prefix_size=prefix_size)
         logging.debug(f"Loader >> Loaded job {self.job_id} [{init_size}/{expected_output}] from source '{selected_source.nickname}'")
         if self.scheduler.receive_job(job):
             return True
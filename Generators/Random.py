@@ -4,11 +4,12 @@ from Generators.BaseGenerator import Generator
 class RandomGenerator(Generator):
     """
     Creates new Jobs with random initial size and output size.
-    - init_fn: function to generate initial size of a job.
-    - output_fn: function to generate expected output size of a job.
+    - init_fn: function to generate initial size of a job, called with the size random stream (numpy Generator).
+    - output_fn: function to generate expected output size of a job, called with the size random stream.
+    - prefix_fn: optional function to draw the shared prompt prefix of a job (see Generator).
     """
-    def __init__(self, env, scheduler, speed, total, dropout, init_fn, output_fn):
-        super().__init__(env, scheduler, speed, total, dropout, name="Random Generator")
+    def __init__(self, env, scheduler, speed, total, dropout, init_fn, output_fn, seed=None, prefix_fn=None):
+        super().__init__(env, scheduler, speed, total, dropout, name="Random Generator", seed=seed, prefix_fn=prefix_fn)
         self.init_size_fn = init_fn
         self.output_size_fn = output_fn
         self.counter_init: list[int] = []
@@ -21,10 +22,13 @@ class RandomGenerator(Generator):
         """
         arrival_time = self.env.now
 
-        p = self.init_size_fn()
-        m = self.output_size_fn()
+        p = self.init_size_fn(self.size_rng)
+        m = self.output_size_fn(self.size_rng)
 
-        job = Job(job_id=self.job_id, arrival_time=arrival_time, init_size=p, expected_output=m)
+        prefix_id, prefix_size = self.draw_prefix(p)
+
+        job = Job(job_id=self.job_id, arrival_time=arrival_time, init_size=p, expected_output=m,
+                  prefix_id=prefix_id, prefix_size=prefix_size)
         if self.scheduler.receive_job(job):
             self.counter_init.append(p)
             self.counter_output.append(m)
@@ -0,0 +1,73 @@
+import math
+
+from Memory import Memory
+
+
+class HostMemory(Memory):
+    """
+    Host memory tier (e.g., DRAM) of a device, holding the tokens of the jobs swapped out of the device memory.
+    - Usually larger and slower than the device memory: tokens move over a link of `bandwidth` tokens per step.
+    - Transfers use the link one at a time in FIFO order, and overlap with the compute of the device.
+    - Every owner (job id) holds its tokens until it is swapped back in.
+    """
+
+    def __init__(self, env, capacity, bandwidth, threshold=1.0):
+        if bandwidth <= 0:
+            raise ValueError("Host link bandwidth must be positive.")
+        super().__init__(env, capacity, threshold)
+        self.bandwidth = bandwidth
+        self.holders: dict[object, int] = {}  # owner -> tokens
+        self.link_free_time = 0
+        self.transferred_tokens = 0
+        self.transfer_steps = 0
+
+    def store(self, tokens: int, owner) -> bool:
+        """
+        Keep `tokens` tokens of `owner`.
+        :return: False if the host memory is full.
+        """
+        if not self.request(tokens, owner=owner):
+            return False
+        self.holders[owner] = tokens
+        return True
+
+    def load(self, owner) -> int:
+        """
+        Hand back the tokens of `owner`.
+        :return: The number of tokens released.
+        """
+        tokens = self.holders.pop(owner)
+        self.release(tokens, owner=owner)
+        return tokens
+
+    def holds(self, owner) -> bool:
+        return owner in self.holders
+
+    def transfer_time(self, tokens: int) -> int:
+        """
+        Steps from now until a transfer of `tokens` tokens issued now completes, queueing included.
+        """
+        return max(self.env.now, self.link_free_time) + self._duration(tokens) - self.env.now
+
+    def transfer(self, tokens: int) -> int:
+        """
+        Queue a transfer of `tokens` tokens on the link.
+        :return: The time the transfer completes.
+        """
+        duration = self._duration(tokens)
+        self.link_free_time = max(self.env.now, self.link_free_time) + duration
+        self.transferred_tokens += tokens
+        self.transfer_steps += duration
+        return self.link_free_time
+
+    def _duration(self, tokens: int) -> int:
+        return int(math.ceil(tokens / self.bandwidth))
+
+    def __str__(self):
+        return (
+            f"Host Memory: {self.vacancies}/{self.capacity} tokens available, "
+            f"{self.bandwidth} tokens/step link "
+            f"(Peak: {self.peak_usage / self.capacity * 100:.1f}%, Average: {self.average_usage / self.capacity * 100:.1f}%, "
+            f"{self.transferred_tokens} tokens transferred in {self.transfer_steps} steps, "
+            f"Failures: {self.allocation_failures})"
+        )
@@ -0,0 +1,145 @@
+import heapq
+from itertools import islice
+
+
+class IndexedHeap:
+    """
+    Binary min-heap of items with a position index, so that any item can be updated or removed in O(log n).
+    - Items must be hashable, and appear at most once.
+    - Keys must be comparable, ties are broken by insertion order (an update keeps the original order).
+    """
+
+    def __init__(self):
+        self._heap: list[list] = []  # [key, insertion order, item]
+        self._index: dict = {}  # item -> position in the heap
+        self._count = 0
+
+    def push(self, item, key) -> None:
+        if item in self._index:
+            raise ValueError(f"{item} is already in the heap.")
+        self._heap.append([key, self._count, item])
+        self._count += 1
+        self._index[item] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def pop(self):
+        """
+        Remove and return the item with the smallest key.
+        """
+        if not self._heap:
+            raise IndexError("pop from an empty heap")
+        item = self._heap[0][2]
+        self._remove_at(0)
+        return item
+
+    def peek(self):
+        return self._heap[0][2]
+
+    def peek_key(self):
+        return self._heap[0][0]
+
+    def remove(self, item) -> None:
+        self._remove_at(self._index[item])
+
+    def update(self, item, key) -> None:
+        """
+        Change the key of an item, in either direction.
+        """
+        pos = self._index[item]
+        old_key = self._heap[pos][0]
+        self._heap[pos][0] = key
+        if key < old_key:
+            self._sift_up(pos)
+        elif old_key < key:
+            self._sift_down(pos)
+
+    def key(self, item):
+        return self._heap[self._index[item]][0]
+
+    def rank_key(self, item) -> tuple:
+        """
+        The full ordering key of an item: (key, insertion order).
+        """
+        entry = self._heap[self._index[item]]
+        return entry[0], entry[1]
+
+    def ordered(self):
+        """
+        Iterate over the items by increasing key, lazily in O(log k) per item.
+        The heap must not be modified during the iteration.
+        """
+        heap = self._heap
+        if not heap:
+            return
+        frontier = [(heap[0][0], heap[0][1], 0)]
+        while frontier:
+            _, _, pos = heapq.heappop(frontier)
+            yield heap[pos][2]
+            for child in (2 * pos + 1, 2 * pos + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child][0], heap[child][1], child))
+
+    def smallest(self, k: int) -> list:
+        """
+        The k items with the smallest keys, in order, in O(k log k).
+        """
+        return list(islice(self.ordered(), k))
+
+    def __contains__(self, item) -> bool:
+        return item in self._index
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __bool__(self) -> bool:
+        return bool(self._heap)
+
+    def __iter__(self):
+        """
+        Iterate over the items in heap (not sorted) order.
+        """
+        return (entry[2] for entry in self._heap)
+
+    def _remove_at(self, pos: int) -> None:
+        heap = self._heap
+        del self._index[heap[pos][2]]
+        last = heap.pop()
+        if pos < len(heap):
+            heap[pos] = last
+            self._index[last[2]] = pos
+            self._sift_up(pos)
+            self._sift_down(self._index[last[2]])
+
+    def _sift_up(self, pos: int) -> None:
+        heap, index = self._heap, self._index
+        entry = heap[pos]
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            if heap[parent][:2] <= entry[:2]:
+                break
+            heap[pos] = heap[parent]
+            index[heap[pos][2]] = pos
+            pos = parent
+        heap[pos] = entry
+        index[entry[2]] = pos
+
+    def _sift_down(self, pos: int) -> None:
+        heap, index = self._heap, self._index
+        size = len(heap)
+        entry = heap[pos]
+        while True:
+            child = 2 * pos + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1][:2] < heap[child][:2]:
+                child += 1
+            if entry[:2] <= heap[child][:2]:
+                break
+            heap[pos] = heap[child]
+            index[heap[pos][2]] = pos
+            pos = child
+        heap[pos] = entry
+        index[entry[2]] = pos
+
+    def __str__(self):
+        return f"IndexedHeap: {len(self._heap)} items"
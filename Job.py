@@ -1,5 +1,6 @@
 from enum import Enum
 
+
 class Job:
     """
     Represents a single job/request.
@@ -8,6 +9,10 @@ class Job:
     - arrival_time: when this job arrived in the system.
     - decode_start_time: when it first got scheduled/allocated memory.
     - decode_finish_time: when it completed generating M tokens.
+    - prefix_id, prefix_size: optional prompt prefix shared with other jobs (e.g., a system prompt),
+      its first prefix_size tokens can be served from the prefix cache of a device memory.
+
+    Schedulers advance their whole batch in one pass with advance_batch.
     """
 
     class State(Enum):
@@ -19,7 +24,14 @@ class Job:
         DECODE      = 2
         FINISHED    = 3
 
-    def __init__(self, job_id, arrival_time, init_size, expected_output):
+    __slots__ = (
+        "job_id", "state", "init_size", "final_size", "current_size", "swap_size",
+        "arrival_time", "prefill_start_time", "prefill_finish_time", "decode_start_time", "decode_finish_time",
+        "execution_time", "last_scheduled_time", "starvation_count", "quantum", "is_priority",
+        "ready_time", "restore_time", "prefilled_size", "prefix_id", "prefix_size",
+    )
+
+    def __init__(self, job_id, arrival_time, init_size, expected_output, prefix_id: int|None = None, prefix_size: int = 0):
         self.job_id = job_id
         self.state = Job.State.INITIAL
         self.init_size = init_size
@@ -40,6 +52,26 @@ class Job:
         self.quantum = 0
         self.is_priority = False
 
+        # Preemption costs: the job cannot decode before ready_time, and waits restore_time more steps once swapped in
+        self.ready_time = None
+        self.restore_time = 0
+        # Prompt tokens prefilled so far, for chunked prefill
+        self.prefilled_size = 0
+        # Shared prompt prefix
+        if prefix_id is None:
+            prefix_id, prefix_size = 0, 0
+        self.prefix_id = prefix_id
+        self.prefix_size = min(prefix_size, init_size)
+
+    @property
+    def prefix(self) -> tuple[int, int]|None:
+        """
+        The (prefix id, prefix size) of the job, as expected by Memory.request, or None without a prefix.
+        """
+        if self.prefix_size <= 0:
+            return None
+        return self.prefix_id, self.prefix_size
+
     @property
     def is_finished(self):
         return self.current_size >= self.final_size or self.decode_finish_time is not None
@@ -50,17 +82,42 @@ class Job:
             return self.decode_finish_time - self.arrival_time
         return None
 
-    def advance(self, curr_time):
-        self.execution_time += 1
+    def advance(self, curr_time, steps=1):
+        self.execution_time += steps
 
         if self.state == Job.State.DECODE:
             if self.decode_start_time is None:
                 self.decode_start_time = curr_time
-            self.current_size += 1
+            self.current_size += steps
         elif self.state == Job.State.PREFILL:
             if self.prefill_start_time is None:
                 self.prefill_start_time = curr_time
 
+    @staticmethod
+    def advance_batch(jobs: list["Job"], curr_time, steps=1) -> list["Job"]:
+        """
+        Advance a whole batch in one pass, followed by finish detection.
+        - Decoding jobs grow by `steps` tokens, prefilling jobs only account for execution time.
+        - Decoding jobs reaching their final size are stamped with the time of the last step.
+        :return: The jobs that finished.
+        """
+        decode, prefill = Job.State.DECODE, Job.State.PREFILL
+        finished = []
+        for job in jobs:
+            job.execution_time += steps
+            state = job.state
+            if state is decode:
+                if job.decode_start_time is None:
+                    job.decode_start_time = curr_time
+                job.current_size += steps
+                if job.current_size >= job.final_size and job.decode_finish_time is None:
+                    job.decode_finish_time = curr_time + steps - 1
+                    finished.append(job)
+            elif state is prefill:
+                if job.prefill_start_time is None:
+                    job.prefill_start_time = curr_time
+        return finished
+
     def __repr__(self):
         if self.is_finished or self.state == Job.State.FINISHED:
             return f"Job({self.job_id}): Finished at {self.decode_finish_time}"
@@ -1,6 +1,20 @@
+from collections import OrderedDict
+
+
 class Memory:
     """
     Simulated shared resource that can hold up to `capacity` tokens total.
+    Allocations may name an owner (e.g., a job id), which this token counter ignores,
+    but allocators with a per-owner layout (see PagedMemory) rely on.
+
+    It also caches shared prompt prefixes:
+    - A request may name a prefix (prefix id, prefix size), its tokens are shared by every owner using it.
+      The pair identifies the prefix, e.g., a truncated system prompt is another prefix.
+    - Cached prefixes are reference-counted, an owner holds its reference until it releases its memory.
+    - Unreferenced prefixes stay cached, and are evicted (least recently used first) when memory is needed.
+      Their memory is counted as available.
+
+    The usage (tokens held, cached prefixes included) is integrated over time for the average usage.
     """
 
     def __init__(self, env, capacity, threshold=1.0):
@@ -9,37 +23,225 @@ class Memory:
         self.vacancies = capacity
         self.threshold = threshold
         self.peak_usage = 0
+        self.allocation_failures = 0
+        # Time integral of the usage, up to self._usage_time
+        self._usage_integral = 0
+        self._usage_time = 0
+        # Prefix cache
+        self.prefix_cache: dict[tuple, int] = {}  # (prefix id, size) -> references
+        self._evictable: OrderedDict = OrderedDict()  # Unreferenced prefixes, least recently used first
+        self._evictable_tokens = 0
+        self._owner_prefix: dict[object, tuple] = {}  # owner -> (prefix, hit)
+        self.prefix_lookups = 0
+        self.prefix_hits = 0
+        self.prefix_hit_tokens = 0
+        self.prefix_evictions = 0
 
-    def request(self, amount) -> bool:
-        if amount > self.vacancies:
+    def request(self, amount, owner=None, prefix=None) -> bool:
+        """
+        Allocate `amount` more tokens to `owner`, all or nothing.
+        :param prefix: (prefix id, prefix size) of the first tokens, shared through the prefix cache.
+        :return: True if the tokens were granted.
+        """
+        self._touch()
+        references, shared, needed = None, 0, 0
+        reclaimable = self._evictable_tokens
+        if prefix is not None:
+            prefix = tuple(prefix)
+            shared = prefix[1]
+            references = self.prefix_cache.get(prefix)
+            if references is None:
+                needed += self.footprint(shared)
+            elif references == 0:
+                reclaimable -= self.footprint(shared)
+        needed += self._cost(amount - shared, owner)
+        if needed > self.vacancies + reclaimable:
+            self.allocation_failures += 1
             return False
+
+        if prefix is not None:
+            self.prefix_lookups += 1
+            hit = references is not None
+            if not hit:
+                self._reclaim(self.footprint(shared))
+                self._allocate(shared, ("prefix", prefix))
+                references = 0
+            else:
+                self.prefix_hits += 1
+                self.prefix_hit_tokens += shared
+                if references == 0:
+                    del self._evictable[prefix]
+                    self._evictable_tokens -= self.footprint(shared)
+            self.prefix_cache[prefix] = references + 1
+            self._owner_prefix[owner] = (prefix, hit)
+        self._reclaim(self._cost(amount - shared, owner))
+        self._allocate(amount - shared, owner)
+        self._update_peak()
+        return True
+
+    def reserve(self, amount, owners=None, gradual=False) -> int:
+        """
+        Reserve memory for a whole batch at once, e.g., one token for every job of a batch.
+        Partial grants are allowed, and the peak usage is updated once.
+        :param amount: Number of tokens, or number of tokens for each owner when `owners` is given.
+        :param owners: Owners to grow by `amount` tokens each, granted in order.
+        :param gradual: The owners grow by one token per step over the next `amount` steps (e.g., a fast-forwarded batch),
+          the average usage is accounted as if the tokens were reserved step by step.
+        :return: The number of tokens (or owners) granted, less than asked when the memory runs out.
+        """
+        self._touch()
+        if owners is None:
+            self._reclaim(amount)
+            granted = min(amount, self.vacancies)
+            reserved = granted
         else:
-            self.vacancies -= amount
-            if self.occupied_tokens > self.peak_usage:
-                self.peak_usage = self.occupied_tokens
-            return True
+            self._reclaim(amount * len(owners))
+            granted = min(len(owners), self.vacancies // amount) if amount > 0 else len(owners)
+            reserved = granted * amount
+        if granted < (amount if owners is None else len(owners)):
+            self.allocation_failures += 1
+        if reserved > 0:
+            self._allocate(reserved, None)
+            self._update_peak()
+            if gradual and owners is not None:
+                # The k-th token of an owner is only held from the k-th step on
+                self._usage_integral -= granted * amount * (amount + 1) // 2
+        return granted
+
+    def release(self, amount, owner=None) -> int:
+        """
+        Release `amount` tokens of `owner`, an owner holding a prefix must release all its tokens at once.
+        """
+        self._touch()
+        owned = self._owner_prefix.pop(owner, None)
+        if owned is not None:
+            prefix, _ = owned
+            amount -= prefix[1]
+            self.prefix_cache[prefix] -= 1
+            if self.prefix_cache[prefix] == 0:
+                self._evictable[prefix] = None
+                self._evictable_tokens += self.footprint(prefix[1])
+        self._free(amount, owner)
+        return self.vacancies
+
+    def shared_tokens(self, owner) -> int:
+        """
+        Number of tokens of `owner` found in the prefix cache (0 if its prefix was not cached yet).
+        """
+        owned = self._owner_prefix.get(owner)
+        if owned is None or not owned[1]:
+            return 0
+        return owned[0][1]
+
+    def max_growth(self, owners) -> int|float:
+        """
+        Number of tokens every owner can grow by at once without evicting cached prefixes,
+        e.g., the steps a batch can decode without failing.
+        """
+        if not owners:
+            return float("inf")
+        return self.vacancies // len(owners)
+
+    def footprint(self, tokens) -> int:
+        """
+        Memory occupied by an allocation holding `tokens` tokens.
+        """
+        return tokens
 
-    def release(self, amount) -> int:
+    def _cost(self, amount, owner) -> int:
+        """
+        Memory newly occupied when `owner` grows by `amount` tokens.
+        """
+        return amount
+
+    def _allocate(self, amount, owner) -> None:
+        """
+        Grow `owner` by `amount` tokens, the memory must be vacant.
+        """
+        self.vacancies -= amount
+
+    def _free(self, amount, owner) -> None:
+        """
+        Shrink `owner` by `amount` tokens.
+        """
         self.vacancies += amount
         if self.vacancies > self.capacity:
             raise ValueError("Releasing more tokens than capacity.")
-        return self.vacancies
+
+    def _reclaim(self, needed) -> None:
+        """
+        Evict unreferenced prefixes, least recently used first, until `needed` tokens are vacant.
+        """
+        while self.vacancies < needed and self._evictable:
+            prefix, _ = self._evictable.popitem(last=False)
+            del self.prefix_cache[prefix]
+            self._evictable_tokens -= self.footprint(prefix[1])
+            self._free(prefix[1], ("prefix", prefix))
+            self.prefix_evictions += 1
+
+    def _touch(self) -> None:
+        """
+        Integrate the usage up to now, before it changes.
+        """
+        now = self.env.now
+        if now != self._usage_time:
+            self._usage_integral += (self.capacity - self.vacancies) * (now - self._usage_time)
+            self._usage_time = now
+
+    def _update_peak(self) -> None:
+        used = self.capacity - self.vacancies
+        if used > self.peak_usage:
+            self.peak_usage = used
 
     @property
     def occupied_tokens(self):
-        return self.capacity - self.vacancies
+        """
+        Memory in use, excluding the unreferenced prefixes that can be evicted.
+        """
+        return self.capacity - self.available_tokens
 
     @property
     def available_tokens(self):
-        return self.vacancies
+        return self.vacancies + self._evictable_tokens
+
+    @property
+    def average_usage(self) -> float:
+        """
+        Time-averaged number of tokens held since the beginning of the simulation.
+        """
+        now = self.env.now
+        if now <= 0:
+            return 0.0
+        integral = self._usage_integral + (self.capacity - self.vacancies) * (now - self._usage_time)
+        return integral / now
 
     @property
     def safe_capacity(self):
         return self.capacity * self.threshold
 
+    @property
+    def cached_tokens(self) -> int:
+        """
+        Tokens of the cached prefixes, referenced or not.
+        """
+        return sum(size for _, size in self.prefix_cache)
+
+    @property
+    def prefix_hit_rate(self) -> float:
+        return self.prefix_hits / self.prefix_lookups if self.prefix_lookups else 0.0
+
+    def _prefix_str(self) -> str:
+        if not self.prefix_lookups:
+            return ""
+        return (
+            f", Prefix Cache: {len(self.prefix_cache)} prefixes ({self.cached_tokens} tokens), "
+            f"{self.prefix_hit_rate * 100:.1f}% hits, {self.prefix_evictions} evictions"
+        )
+
     def __str__(self):
         return (
             f"Memory: {self.vacancies}/{self.capacity} tokens available, "
             f"Threshold {self.threshold} "
-            f"(Peak: {self.peak_usage / self.capacity * 100:.1f}%)"
+            f"(Peak: {self.peak_usage / self.capacity * 100:.1f}%, Average: {self.average_usage / self.capacity * 100:.1f}%)"
+            f"{self._prefix_str()}"
         )
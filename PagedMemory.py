@@ -0,0 +1,178 @@
+import math
+
+from Memory import Memory
+
+
+class PagedMemory(Memory):
+    """
+    Simulated memory split into fixed-size blocks of `block_size` tokens, like a paged KV cache.
+    - Free blocks are kept in a free-block list, any free block can serve any owner.
+    - Every owner (e.g., a job id) has a block table, and gets a new block only when its last block is full.
+    - Tokens are allocated by whole blocks, so occupied_tokens counts the unused tail of the last blocks too:
+      this internal fragmentation is reported together with the block utilization and the allocation failures.
+    - Allocations without an owner share a single anonymous block table, and every cached prefix has its own.
+    """
+
+    def __init__(self, env, capacity, threshold=1.0, block_size=16):
+        if block_size <= 0:
+            raise ValueError("Block size must be positive.")
+        self.block_size = block_size
+        self.num_blocks = capacity // block_size
+        # Trailing tokens that do not make a whole block are not usable
+        super().__init__(env, self.num_blocks * block_size, threshold)
+        self.free_blocks: list[int] = list(range(self.num_blocks - 1, -1, -1))
+        self.block_tables: dict[object, list[int]] = {}
+        self.owner_tokens: dict[object, int] = {}
+        self.stored_tokens = 0
+        self.peak_fragmentation = 0
+
+    def _blocks_for(self, tokens) -> int:
+        return -(-tokens // self.block_size)
+
+    def _cost(self, amount, owner) -> int:
+        """
+        Override the _cost method: `owner` takes a new block only when its last block is full.
+        """
+        tokens = self.owner_tokens.get(owner, 0)
+        new_blocks = self._blocks_for(tokens + amount) - len(self.block_tables.get(owner, ()))
+        return max(new_blocks, 0) * self.block_size
+
+    def _allocate(self, amount, owner) -> None:
+        """
+        Override the _allocate method to grow the block table of `owner` from the free-block list.
+        """
+        if amount == 0:
+            return
+        tokens = self.owner_tokens.get(owner, 0) + amount
+        table = self.block_tables.setdefault(owner, [])
+        needed = self._blocks_for(tokens) - len(table)
+        if needed > 0:
+            table += self.free_blocks[-needed:]
+            del self.free_blocks[-needed:]
+        self.owner_tokens[owner] = tokens
+        self.stored_tokens += amount
+        self.vacancies = len(self.free_blocks) * self.block_size
+
+    def _free(self, amount, owner) -> None:
+        """
+        Override the _free method to return the blocks `owner` no longer needs to the free-block list.
+        """
+        if amount == 0:
+            return
+        tokens = self.owner_tokens.get(owner, 0) - amount
+        if tokens < 0:
+            raise ValueError(f"Releasing more tokens than held by {owner}.")
+        table = self.block_tables[owner]
+        extra = len(table) - self._blocks_for(tokens)
+        if extra > 0:
+            self.free_blocks += table[-extra:]
+            del table[-extra:]
+        if tokens == 0:
+            del self.owner_tokens[owner]
+            del self.block_tables[owner]
+        else:
+            self.owner_tokens[owner] = tokens
+        self.stored_tokens -= amount
+        self.vacancies = len(self.free_blocks) * self.block_size
+
+    def _update_peak(self) -> None:
+        """
+        Override the _update_peak method to track the peak internal fragmentation too.
+        """
+        super()._update_peak()
+        if self.internal_fragmentation > self.peak_fragmentation:
+            self.peak_fragmentation = self.internal_fragmentation
+
+    def reserve(self, amount, owners=None, gradual=False) -> int:
+        """
+        Override the reserve method: owners whose last block has room take no new block.
+        Without owners, the tokens go to the anonymous block table one at a time.
+        """
+        self._touch()
+        granted = 0
+        for owner in owners if owners is not None else [None] * amount:
+            step = amount if owners is not None else 1
+            cost = self._cost(step, owner)
+            self._reclaim(cost)
+            if cost > self.vacancies:
+                self.allocation_failures += 1
+                break
+            if gradual and owners is not None:
+                # The j-th new block is only held from the step that fills the previous one
+                slack = len(self.block_tables.get(owner, ())) * self.block_size - self.owner_tokens.get(owner, 0)
+                new_blocks = cost // self.block_size
+                first = slack + 1
+                self._usage_integral -= self.block_size * (
+                    new_blocks * first + self.block_size * new_blocks * (new_blocks - 1) // 2)
+            self._allocate(step, owner)
+            granted += 1
+        self._update_peak()
+        return granted
+
+    def max_growth(self, owners) -> int|float:
+        """
+        Override the max_growth method: every owner first fills the tail of its last block,
+        then all of them share the free blocks (cached prefixes are not evicted).
+        """
+        if not owners:
+            return math.inf
+        slacks = [len(self.block_tables.get(owner, ())) * self.block_size - self.owner_tokens.get(owner, 0)
+                  for owner in owners]
+        free = len(self.free_blocks)
+
+        def fits(tokens):
+            return sum(self._blocks_for(tokens - slack) for slack in slacks if tokens > slack) <= free
+
+        # Binary search of the largest growth that fits
+        low, high = 0, max(slacks) + free * self.block_size + 1
+        while high - low > 1:
+            mid = (low + high) // 2
+            if fits(mid):
+                low = mid
+            else:
+                high = mid
+        return low
+
+    def footprint(self, tokens) -> int:
+        """
+        Override the footprint method: an allocation takes whole blocks.
+        """
+        return self._blocks_for(tokens) * self.block_size
+
+    @property
+    def used_blocks(self) -> int:
+        return self.num_blocks - len(self.free_blocks)
+
+    @property
+    def block_utilization(self) -> float:
+        """
+        Fraction of the blocks in use.
+        """
+        return self.used_blocks / self.num_blocks if self.num_blocks else 0.0
+
+    @property
+    def internal_fragmentation(self) -> int:
+        """
+        Tokens allocated but not filled, in the last block of every owner.
+        """
+        return self.capacity - self.vacancies - self.stored_tokens
+
+    @property
+    def fragmentation_ratio(self) -> float:
+        """
+        Fraction of the occupied memory lost to internal fragmentation.
+        """
+        used = self.capacity - self.vacancies
+        return self.internal_fragmentation / used if used else 0.0
+
+    def __str__(self):
+        return (
+            f"PagedMemory: {len(self.free_blocks)}/{self.num_blocks} blocks of {self.block_size} tokens available, "
+            f"Threshold {self.threshold} "
+            f"(Peak: {self.peak_usage / self.capacity * 100:.1f}%, Average: {self.average_usage / self.capacity * 100:.1f}%, "
+            f"Utilization: {self.block_utilization * 100:.1f}%, "
+            f"Fragmentation: {self.internal_fragmentation} tokens ({self.fragmentation_ratio * 100:.1f}%), "
+            f"Peak Fragmentation: {self.peak_fragmentation} tokens, "
+            f"Failures: {self.allocation_failures})"
+            f"{self._prefix_str()}"
+        )
@@ -0,0 +1,130 @@
+import math
+from enum import Enum
+
+
+class Preemption:
+    """
+    Preemption policy of a scheduler, with the cost of bringing a preempted job back.
+    - FREE: the job keeps its tokens in swap_size and resumes as soon as it is swapped in (no cost).
+    - SWAP: the tokens are copied to the host and back over a link of `swap_bandwidth` tokens per step.
+      The job cannot be swapped in before its swap-out completes, and waits for the swap-in once resident.
+    - RECOMPUTE: the tokens are dropped and prefilled again once the job is resident,
+      at `prefill_rate` tokens per step.
+    - AUTO: the cheaper of SWAP and RECOMPUTE, per victim.
+    A waiting job holds its memory and its place in the batch, but does not decode.
+
+    On a device with a host memory tier (see HostMemory), FREE and SWAP keep the tokens in the host memory
+    and copy them over its link instead of `swap_bandwidth`.
+    For the prefill schedulers, the policy prices the move of a partially prefilled prompt instead (see migrate).
+    """
+    class Mode(Enum):
+        """
+        How preempted jobs get their tokens back.
+        """
+        FREE      = "Free"
+        SWAP      = "Swap"
+        RECOMPUTE = "Recompute"
+        AUTO      = "Auto"
+
+    def __init__(self, mode: Mode = Mode.FREE, swap_bandwidth: float|None = None, prefill_rate: float|None = None):
+        """
+        :param mode: The preemption mode.
+        :param swap_bandwidth: Host link bandwidth in tokens per step, for SWAP and AUTO without a host memory tier.
+        :param prefill_rate: Prefill throughput in tokens per step, for RECOMPUTE and AUTO.
+        """
+        if mode in (Preemption.Mode.RECOMPUTE, Preemption.Mode.AUTO) and not prefill_rate:
+            raise ValueError(f"{mode.value} preemption needs a prefill rate.")
+        self.mode = mode
+        self.swap_bandwidth = swap_bandwidth
+        self.prefill_rate = prefill_rate
+        # Statistics
+        self.swaps = 0
+        self.recomputes = 0
+        self.restore_steps = 0
+
+    def swap_time(self, tokens: int) -> int:
+        """
+        Steps to copy `tokens` tokens one way over the host link.
+        """
+        if not self.swap_bandwidth:
+            raise ValueError(f"{self.mode.value} preemption needs a swap bandwidth or a host memory tier.")
+        return int(math.ceil(tokens / self.swap_bandwidth))
+
+    def recompute_time(self, tokens: int) -> int:
+        """
+        Steps to prefill `tokens` tokens again.
+        """
+        return int(math.ceil(tokens / self.prefill_rate))
+
+    def choose(self, tokens: int, swap_time: int|None = None) -> Mode:
+        """
+        The mode used to preempt a job holding `tokens` tokens, AUTO picks the cheaper one.
+        :param swap_time: One-way swap time, defaults to swap_time(tokens).
+        """
+        if self.mode != Preemption.Mode.AUTO:
+            return self.mode
+        if swap_time is None:
+            swap_time = self.swap_time(tokens)
+        if 2 * swap_time <= self.recompute_time(tokens):
+            return Preemption.Mode.SWAP
+        return Preemption.Mode.RECOMPUTE
+
+    def preempt(self, tokens: int, mode: Mode|None = None) -> tuple[int, int]:
+        """
+        Account the preemption of a job holding `tokens` tokens.
+        :param mode: The mode to use, defaults to choose(tokens).
+        :return: (steps before it can be swapped in, steps to wait once swapped in).
+        """
+        if mode is None:
+            mode = self.choose(tokens)
+        if mode == Preemption.Mode.SWAP:
+            swap_time = self.swap_time(tokens)
+            self.account(2 * swap_time, mode)
+            return swap_time, swap_time
+        if mode == Preemption.Mode.RECOMPUTE:
+            recompute_time = self.recompute_time(tokens)
+            self.account(recompute_time, mode)
+            return 0, recompute_time
+        return 0, 0
+
+    def migrate_mode(self, tokens: int) -> Mode:
+        """
+        The mode used to move a partially prefilled prompt holding `tokens` computed tokens to another device.
+        SWAP copies the tokens over the link once, RECOMPUTE drops them, AUTO picks the cheaper one.
+        """
+        if self.mode != Preemption.Mode.AUTO:
+            return self.mode
+        if self.swap_time(tokens) <= self.recompute_time(tokens):
+            return Preemption.Mode.SWAP
+        return Preemption.Mode.RECOMPUTE
+
+    def migrate(self, tokens: int) -> int|None:
+        """
+        Account the move of a partially prefilled prompt, holding `tokens` computed tokens, to another device.
+        :return: Steps before the tokens are on the other device, None if they have to be prefilled again.
+        """
+        mode = self.migrate_mode(tokens)
+        if mode == Preemption.Mode.SWAP:
+            swap_time = self.swap_time(tokens)
+            self.account(swap_time, mode)
+            return swap_time
+        if mode == Preemption.Mode.RECOMPUTE:
+            self.account(self.recompute_time(tokens), mode)
+            return None
+        return 0
+
+    def account(self, steps: int, mode: Mode|None = None) -> None:
+        """
+        Count `steps` restore steps, and one preemption in `mode` if given.
+        """
+        if mode == Preemption.Mode.SWAP:
+            self.swaps += 1
+        elif mode == Preemption.Mode.RECOMPUTE:
+            self.recomputes += 1
+        self.restore_steps += steps
+
+    def __str__(self):
+        return (
+            f"{self.mode.value} preemption: {self.swaps} swaps, {self.recomputes} recomputes, "
+            f"{self.restore_steps} restore steps"
+        )
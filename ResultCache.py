@@ -0,0 +1,160 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+
+from System import SysReport
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache of SysReport results.
+    - The key is a SHA-256 hash of every simulation input: the configuration (scheduler, devices, memory,
+      generator parameters, seed...), the contents of the data files and a version stamp of the simulator source.
+    - Each entry is one pickled SysReport (raw arrays included) named after its key.
+    - When the cache grows over `max_bytes`, the least recently used entries are evicted.
+    """
+
+    SUFFIX = ".pkl"
+    # Directories that are not part of the simulator source
+    IGNORED_DIRS = {"venv", ".venv", "build", "dist", "__pycache__", "tests"}
+    # Drivers that only choose the simulations to run, their parameters are already part of the configuration.
+    # main.py builds the simulated system itself, so it stays part of the source.
+    DRIVER_FILES = {"runner.py", "md_main.py", "bench_clock.py"}
+
+    def __init__(self, directory=".sim_cache", max_bytes=256 * 1024 * 1024, source_root=None):
+        """
+        :param directory: Where to store the entries.
+        :param max_bytes: Size bound of the cache.
+        :param source_root: Root of the simulator source used for the version stamp, defaults to this repository.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.source_root = source_root or os.path.dirname(os.path.abspath(__file__))
+        self._file_digests: dict[str, str] = {}
+        self._source_version: str|None = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, config: dict, data_files: list[str]) -> str:
+        """
+        Compute the key of a simulation.
+        :param config: Every parameter of the simulation, must be JSON serializable (or have a stable repr).
+        :param data_files: Input files whose contents the simulation depends on (e.g., CSV traces).
+        """
+        material = {
+            "config": config,
+            "data": [self._file_digest(path) for path in data_files],
+            "source": self.source_version,
+        }
+        blob = json.dumps(material, sort_keys=True, default=repr)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def get(self, key: str) -> SysReport|None:
+        """
+        Return the cached report, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                report = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError) as e:
+            logging.warning(f"ResultCache >> Dropping unreadable entry {key}: {e}")
+            self.invalidate(key)
+            self.misses += 1
+            return None
+        # Refresh the access time for the LRU policy
+        os.utime(path)
+        self.hits += 1
+        return report
+
+    def put(self, key: str, report: SysReport) -> None:
+        """
+        Store a report, then evict old entries if the cache is over its size bound.
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(report, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def invalidate(self, key: str|None = None) -> int:
+        """
+        Remove one entry, or every entry if `key` is None.
+        :return: The number of removed entries.
+        """
+        paths = [self._path(key)] if key is not None else self._entries()
+        removed = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(os.path.getsize(path) for path in self._entries())
+
+    @property
+    def source_version(self) -> str:
+        """
+        Hash of every Python source file of the simulator, any change invalidates all entries.
+        The drivers (see DRIVER_FILES) are left out, so that editing a sweep in runner.py keeps the other entries.
+        """
+        if self._source_version is None:
+            digest = hashlib.sha256()
+            sources = glob.glob(os.path.join(self.source_root, "**", "*.py"), recursive=True)
+            for path in sorted(sources):
+                relpath = os.path.relpath(path, self.source_root)
+                if ResultCache.IGNORED_DIRS.intersection(relpath.split(os.sep)) or relpath in ResultCache.DRIVER_FILES:
+                    continue
+                digest.update(relpath.encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+            self._source_version = digest.hexdigest()
+        return self._source_version
+
+    def _file_digest(self, path: str) -> str:
+        path = os.path.abspath(path)
+        if path not in self._file_digests:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            self._file_digests[path] = digest.hexdigest()
+        return self._file_digests[path]
+
+    def _evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache fits in `max_bytes`.
+        """
+        entries = [(os.path.getmtime(path), os.path.getsize(path), path) for path in self._entries()]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            logging.debug(f"ResultCache >> Evicted {os.path.basename(path)}")
+
+    def _entries(self) -> list[str]:
+        return glob.glob(os.path.join(self.directory, f"*{ResultCache.SUFFIX}"))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{ResultCache.SUFFIX}")
+
+    def __str__(self):
+        return (
+            f"ResultCache: {len(self._entries())} entries in '{self.directory}', "
+            f"{self.size_bytes / 1024 / 1024:.1f}/{self.max_bytes / 1024 / 1024:.1f} MB, "
+            f"{self.hits} hits, {self.misses} misses"
+        )
@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from itertools import islice
+from operator import attrgetter
+
+
+class RingQueue:
+    """
+    Ordered queue of jobs with O(1) append, dequeue, rotation by one position and removal of any job.
+    - Items are indexed by key(item), the job id by default, which must be unique in the queue.
+    - Backed by an OrderedDict (a hash map over a doubly linked list), so it is a ring with an id -> node index.
+    - Supports the list operations used by the schedulers: append, remove, in, len, iteration and small indexes.
+    - Every item carries a stamp that increases with its position, see order().
+    """
+
+    def __init__(self, items=(), key=attrgetter("job_id")):
+        """
+        :param items: Initial items, in order.
+        :param key: Function giving the unique key of an item, must be picklable for snapshots (e.g., attrgetter).
+        """
+        self.key = key
+        self._items: OrderedDict = OrderedDict()
+        self._order: dict = {}  # key -> stamp
+        self._count = 0
+        for item in items:
+            self.append(item)
+
+    def append(self, item) -> None:
+        key = self.key(item)
+        if key in self._items:
+            raise ValueError(f"Key {key} is already in the queue.")
+        self._items[key] = item
+        self._order[key] = self._count
+        self._count += 1
+
+    def popleft(self):
+        """
+        Remove and return the first item.
+        """
+        if not self._items:
+            raise IndexError("pop from an empty queue")
+        key, item = self._items.popitem(last=False)
+        del self._order[key]
+        return item
+
+    def remove(self, item) -> None:
+        self.pop_key(self.key(item))
+
+    def pop_key(self, key):
+        """
+        Remove and return the item with the given key.
+        """
+        try:
+            item = self._items.pop(key)
+        except KeyError:
+            raise ValueError(f"Key {key} not in queue.") from None
+        del self._order[key]
+        return item
+
+    def rotate(self, steps: int = 1) -> list:
+        """
+        Move the first `steps` items to the end of the queue, in O(steps % len).
+        :return: The moved items.
+        """
+        if not self._items:
+            return []
+        items = self._items
+        moved = []
+        for _ in range(steps % len(items)):
+            key = next(iter(items))
+            items.move_to_end(key)
+            self._order[key] = self._count
+            self._count += 1
+            moved.append(items[key])
+        return moved
+
+    def order(self, item) -> int:
+        """
+        Stamp of the place of an item in the queue: the earlier the item, the smaller the stamp.
+        Stamps are not indexes, they only compare positions.
+        """
+        return self._order[self.key(item)]
+
+    def head(self, n: int) -> list:
+        """
+        The first n items, in order.
+        """
+        return list(islice(self._items.values(), n))
+
+    def contains_key(self, key) -> bool:
+        return key in self._items
+
+    def __contains__(self, item) -> bool:
+        return self.key(item) in self._items
+
+    def __getitem__(self, index: int):
+        """
+        Item at a position, in O(min(index, len - index)): meant for the ends of the queue.
+        """
+        size = len(self._items)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("queue index out of range")
+        if index < size - index:
+            return next(islice(self._items.values(), index, None))
+        return next(islice(reversed(self._items.values()), size - 1 - index, None))
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __reversed__(self):
+        return reversed(self._items.values())
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __bool__(self) -> bool:
+        return bool(self._items)
+
+    def __str__(self):
+        return f"RingQueue: {len(self._items)} items"
@@ -1,43 +1,68 @@
-import simpy
+import math
 import logging
 from abc import abstractmethod
 from Memory import Memory
 from Job import Job
+from RingQueue import RingQueue
+from IndexedHeap import IndexedHeap
+from Preemption import Preemption
+from StepCost import StepWork
 
 
 class Scheduler:
     """
     Base Scheduler class.
     Manages a queue/list of waiting jobs and picks which job runs next.
+
+    Running totals of the run queue memory are kept up to date on every add, remove, swap and growth,
+    and finished jobs are recorded when they cross their final size instead of scanning the run queue,
+    so subclasses must go through add_job/remove_job, _swap_in/_swap_out and _advance_batch.
+    The run queue is a RingQueue indexed by job id, so that any job is removed in O(1).
+    Memory-resident jobs are indexed by eviction order (see _eviction_key) to find swap victims in O(log n).
+    Swapped jobs pay the cost of the preemption policy (see Preemption) when they come back:
+    a resident job waiting for its tokens keeps its place in the batch but does not decode.
+    Swap victims go to the host memory tier of the device when it has one (see _evict).
     """
-    def __init__(self, env, device, memory, batch, name="Base Scheduler"):
+    def __init__(self, env, device, memory, batch, name="Base Scheduler", preemption: Preemption|None = None):
         self.name = name
         self.env = env
         self.device = device
         self.memory : Memory = memory
         self.batch : int = batch
-        self.run_queue : list[Job] = []
+        self.preemption : Preemption = preemption if preemption is not None else Preemption()
+        self.run_queue : RingQueue = RingQueue()
+        # Running totals of the run queue, see committed_tokens and expected_tokens
+        self._committed_tokens = 0
+        self._expected_tokens = 0
+        # Finished jobs waiting for the cleanup of the next step (an ordered set)
+        self._finished: dict[Job, None] = {}
+        # Resident jobs, the first one is the next swap victim
+        self._residents = IndexedHeap()
 
     def add_job(self, job : Job) -> bool:
         self.run_queue.append(job)
+        self._account(job, 1)
+        # E.g., a job moved here before the cleanup of the device it finished on
+        if job.is_finished:
+            self._finished[job] = None
         return True
 
     def remove_job(self, job : Job):
         if job in self.run_queue:
             self.run_queue.remove(job)
+            self._account(job, -1)
+            self._finished.pop(job, None)
+            if job in self._residents:
+                self._residents.remove(job)
         else:
             raise ValueError("Job not in run queue.")
 
     def step(self) -> list[Job]:
         picked_jobs = []
+        ready_jobs = []
 
-        # Clean up finished jobs first:
-        finished_jobs = [j for j in self.run_queue if j.is_finished]
-        for job in finished_jobs:
-            self.memory.release(job.current_size)
-            self.remove_job(job)
-            job.state = Job.State.FINISHED
-            self.device.global_scheduler.finished_jobs.append(job)
+        # Clean up the jobs finished in the previous step first
+        self._hand_back_finished()
 
         if not self.run_queue:
             logging.info(f"{self.device.name} >> No jobs to run - Empty run queue.")
@@ -56,9 +81,8 @@ class Scheduler:
         for next_job in next_jobs:
             # If this is a swapped out job, we need to re-allocate memory for it
             if next_job.current_size == 0 and next_job.swap_size > 0 and next_job.decode_start_time is not None:
-                if self.memory.request(next_job.swap_size):
-                    next_job.current_size = next_job.swap_size
-                    next_job.swap_size = 0
+                if self.memory.request(next_job.swap_size, owner=next_job.job_id, prefix=next_job.prefix):
+                    self._swap_in(next_job, next_job.swap_size)
                     logging.debug(f"{self.device.name} >> Job({next_job.job_id}) swapped back in...")
                 else:
                     logging.warning(f"{self.device.name} >> Job({next_job.job_id}) waiting for {next_job.swap_size} memory... Swap failed.")
@@ -66,33 +90,48 @@ class Scheduler:
 
             # First time running this job
             if next_job.current_size == 0 and next_job.decode_start_time is None:
-                if self.memory.request(next_job.init_size):
+                if self.memory.request(next_job.init_size, owner=next_job.job_id, prefix=next_job.prefix):
                     # Allocate memory for this new job
-                    next_job.current_size = next_job.init_size
+                    self._swap_in(next_job, next_job.init_size)
                     next_job.decode_start_time = self.env.now
                     logging.info(f"{self.device.name} >> Job({next_job.job_id}) starting...")
                 else:
                     logging.warning(f"{self.device.name} >> Job({next_job.job_id}) waiting for {next_job.init_size} memory... Initiate failed.")
                     continue
 
-            # Run the job for 1 step
-            if self.memory.request(1):
-                next_job.advance(self.env.now)
-            else:
-                logging.warning(f"{self.device.name} >> Job({next_job.job_id}) waiting for 1 memory... Run failed.")
+            # A job restoring its tokens (swap-in or recompute) keeps its place but does not run
+            if self._is_stalled(next_job, self.env.now):
+                logging.debug(f"{self.device.name} >> Job({next_job.job_id}) restoring until {next_job.ready_time}...")
                 continue
 
-            # Collect the job that was run
-            picked_jobs.append(next_job)
+            # Collect the resident job
+            ready_jobs.append(next_job)
+
+        # Reserve memory to run the batch for 1 step at once, the jobs beyond the grant have to wait
+        granted = self.memory.reserve(1, owners=[job.job_id for job in ready_jobs])
+        for job in ready_jobs[granted:]:
+            logging.warning(f"{self.device.name} >> Job({job.job_id}) waiting for 1 memory... Run failed.")
+        picked_jobs = ready_jobs[:granted]
 
-            # If job finished after this increment, mark finish time
-            if next_job.is_finished:
-                next_job.decode_finish_time = self.env.now
-                logging.info(f"{self.device.name} >> Job({next_job.job_id}) finished.")
+        # Run the whole batch for 1 step, jobs finishing after this increment get their finish time marked
+        for job in self._advance_batch(picked_jobs, self.env.now):
+            logging.info(f"{self.device.name} >> Job({job.job_id}) finished.")
 
         # Return the next(current) job and a list of finished jobs
         return picked_jobs
 
+    def _hand_back_finished(self) -> None:
+        """
+        Release the jobs finished in the previous step, and hand them back to the global scheduler all at once.
+        """
+        if self._finished:
+            finished_jobs = list(self._finished)
+            for job in finished_jobs:
+                self.memory.release(job.current_size, owner=job.job_id)
+                self.remove_job(job)
+                job.state = Job.State.FINISHED
+            self.device.global_scheduler.finished_jobs.extend(finished_jobs)
+
     @abstractmethod
     def pick_next_task(self) -> list[Job]:
         """
@@ -102,6 +141,229 @@ class Scheduler:
         """
         raise NotImplementedError("Subclasses should implement pick_next_task()")
 
+    def steps_until_event(self) -> int|float:
+        """
+        Number of upcoming steps that are guaranteed to leave this scheduler untouched.
+        Used by the event-driven engine to skip quiet periods.
+        :return: 0 if the next step must be simulated, math.inf if idle until a new job arrives.
+        """
+        if not self.run_queue:
+            return math.inf
+        return 0
+
+    def fast_forward(self, steps: int) -> None:
+        """
+        Apply `steps` quiet steps at once.
+        Only called with steps <= steps_until_event().
+        """
+        pass
+
+    def wait(self, time: int, steps: int) -> None:
+        """
+        Let `steps` steps pass from `time` on, in which the device is still busy with its previous step
+        (see StepCost) and nothing runs.
+        """
+        pass
+
+    def step_work(self, jobs: list[Job]) -> StepWork:
+        """
+        Work of the last step, which ran `jobs`, for the step cost model of the device.
+        By default, every decoding job reads its tokens and produces one more.
+        """
+        work = StepWork()
+        for job in jobs:
+            if job.state == Job.State.DECODE:
+                work.batch_size += 1
+                work.context_tokens += job.current_size
+        return work
+
+    def _stable_steps(self, batch: list[Job]) -> int|float:
+        """
+        Calculate how many upcoming steps `batch` can keep running unchanged:
+        every job is resident and keeps decoding without finishing (or keeps restoring), and there is memory for all of them.
+        :param batch: The jobs the scheduler would pick in the next step.
+        :return: Number of steps, math.inf if nothing runs until another event happens.
+        """
+        steps = math.inf
+        running = []
+        for job in batch:
+            if job.state != Job.State.DECODE or job.current_size == 0 or job.decode_start_time is None:
+                return 0
+            # The step that ends the restoration of a job is not quiet
+            if self._is_stalled(job, self.env.now + 1):
+                steps = min(steps, job.ready_time - self.env.now - 1)
+                continue
+            running.append(job.job_id)
+            # The step that completes a job is not quiet
+            steps = min(steps, job.final_size - job.current_size - 1)
+        steps = min(steps, self.memory.max_growth(running))
+        # Finished jobs are cleaned up at the beginning of the next step
+        if steps > 0 and self._finished:
+            return 0
+        return steps
+
+    def _fast_forward_batch(self, batch: list[Job], steps: int) -> None:
+        """
+        Run every job of `batch` for `steps` steps at once.
+        Only called with steps <= _stable_steps(batch).
+        """
+        batch = [job for job in batch if not self._is_stalled(job, self.env.now + 1)]
+        self.memory.reserve(steps, owners=[job.job_id for job in batch], gradual=True)
+        self._advance_batch(batch, self.env.now + 1, steps)
+
+    def _advance_batch(self, batch: list[Job], curr_time: int, steps: int = 1) -> list[Job]:
+        """
+        Run every job of `batch` for `steps` steps, decoding jobs grow by one token per step.
+        :return: The jobs that finished.
+        """
+        growth = steps * sum(1 for job in batch if job.state == Job.State.DECODE)
+        self._committed_tokens += growth
+        self._expected_tokens += growth
+        finished = Job.advance_batch(batch, curr_time, steps)
+        for job in finished:
+            self._finished[job] = None
+        return finished
+
+    def _swap_in(self, job: Job, size: int) -> None:
+        """
+        Make a queued job resident with `size` tokens, the memory must already be granted.
+        """
+        self._account(job, -1)
+        job.current_size = size
+        job.swap_size = 0
+        self._account(job, 1)
+        self._residents.push(job, self._eviction_key(job))
+        # Restore the tokens of a preempted job, after its swap-out completed
+        host = self.device.host_memory
+        if host is not None and host.holds(job.job_id):
+            ready_time = host.transfer(host.load(job.job_id))
+            self.preemption.account(ready_time - self.env.now)
+            job.ready_time = ready_time
+        elif job.restore_time > 0:
+            ready_time = job.ready_time
+            job.ready_time = max(self.env.now, ready_time if ready_time is not None else 0) + job.restore_time
+            job.restore_time = 0
+        # A job without any output to generate is finished as soon as it is resident
+        if job.is_finished:
+            self._finished[job] = None
+
+    def _swap_out(self, job: Job, mode: Preemption.Mode|None = None) -> None:
+        """
+        Release the memory of a queued resident job, it keeps its tokens in swap_size.
+        The preemption policy decides how long the job takes to come back.
+        :param mode: The preemption mode, defaults to the choice of the policy.
+        """
+        host = self.device.host_memory
+        if host is not None and host.holds(job.job_id):
+            # The tokens were stored in the host memory, they can come back once copied
+            job.ready_time = host.transfer(job.current_size)
+            job.restore_time = 0
+            self.preemption.account(job.ready_time - self.env.now, Preemption.Mode.SWAP)
+        else:
+            swap_out_time, restore_time = self.preemption.preempt(job.current_size, mode)
+            if swap_out_time > 0 or restore_time > 0:
+                job.ready_time = self.env.now + swap_out_time
+                job.restore_time = restore_time
+        self.memory.release(job.current_size, owner=job.job_id)
+        self._account(job, -1)
+        job.swap_size = job.current_size
+        job.current_size = 0
+        self._account(job, 1)
+        self._residents.remove(job)
+
+    def _evict(self, job: Job) -> bool:
+        """
+        Swap out a resident job to free its memory.
+        On a device with a host memory tier, swapped tokens are stored there unless the job is recomputed,
+        and the swap fails when the host memory is full (AUTO falls back to recompute).
+        :return: False if the job could not be swapped out.
+        """
+        host = self.device.host_memory
+        if host is None:
+            self._swap_out(job)
+            return True
+        tokens = job.current_size
+        mode = self.preemption.choose(tokens, host.transfer_time(tokens))
+        if mode != Preemption.Mode.RECOMPUTE and not host.store(tokens, owner=job.job_id):
+            if self.preemption.mode != Preemption.Mode.AUTO:
+                logging.warning(f"{self.device.name} >> Job({job.job_id}) cannot swap out {tokens} tokens... Host memory full.")
+                return False
+            mode = Preemption.Mode.RECOMPUTE
+        self._swap_out(job, mode)
+        return True
+
+    def _migrate(self, job: Job) -> None:
+        """
+        Charge the move of a partially prefilled prompt to another device, following the preemption policy:
+        its prefilled tokens arrive there at job.ready_time, or are dropped to be prefilled again.
+        """
+        if job.prefilled_size <= 0:
+            return
+        transfer_time = self.preemption.migrate(job.prefilled_size)
+        if transfer_time is None:
+            job.prefilled_size = 0
+        elif transfer_time > 0:
+            ready_time = job.ready_time
+            job.ready_time = max(self.env.now, ready_time if ready_time is not None else 0) + transfer_time
+
+    @staticmethod
+    def _is_stalled(job: Job, time: int) -> bool:
+        """
+        Whether `job` is still restoring its tokens at `time`.
+        """
+        ready_time = job.ready_time
+        return ready_time is not None and ready_time > time
+
+    def _eviction_key(self, job: Job):
+        """
+        Eviction order of the resident jobs, the smallest key is swapped out first.
+        By default, the last job of the run queue goes first.
+        """
+        return -self.run_queue.order(job)
+
+    def _reorder_resident(self, job: Job) -> None:
+        """
+        Refresh the eviction order of a job after its key changed (e.g., it moved in the run queue).
+        """
+        if job in self._residents:
+            self._residents.update(job, self._eviction_key(job))
+
+    def _free_memory(self, amount: int, after: Job) -> bool:
+        """
+        Swap out resident jobs coming after `after` in eviction order, the most evictable first,
+        until the memory of `amount` tokens is available. The victims are chosen in one pass over the resident index,
+        and are swapped out even if they cannot free enough memory.
+        Jobs still restoring their tokens are pinned.
+        :param amount: Number of tokens to make available.
+        :param after: Job protected together with every job before it (e.g., the job to swap in).
+        :return: True if the memory of `amount` tokens is available (see Memory.footprint).
+        """
+        needed = self.memory.footprint(amount)
+        available = self.memory.available_tokens
+        if available >= needed:
+            return True
+        limit = self._eviction_key(after)
+        victims = []
+        for job in self._residents.ordered():
+            if available >= needed or not self._residents.key(job) < limit:
+                break
+            if self._is_stalled(job, self.env.now):
+                continue
+            victims.append(job)
+            available += self.memory.footprint(job.current_size)
+        for job in victims:
+            if self._evict(job):
+                logging.debug(f"{self.device.name} >> Job({job.job_id}) swapped out...")
+        return self.memory.available_tokens >= needed
+
+    def _account(self, job: Job, sign: int) -> None:
+        """
+        Add (sign=1) or subtract (sign=-1) the memory of a queued job to the running totals.
+        """
+        current_size = job.current_size
+        self._committed_tokens += sign * current_size
+        self._expected_tokens += sign * (current_size if current_size > 0 else job.init_size)
+
     def pick_movable_job(self, expected_stages: list[Job.State]) -> Job|None:
         """
         Pick a job that can be moved to another device.
@@ -133,34 +395,45 @@ class Scheduler:
         """
         if job not in self.run_queue:
             return False
-        # If job is not running, we can just remove it
-        if job.current_size == 0:
-            self.run_queue.remove(job)
-            return True
         # If job is running, we need to treat it as a swap out and release memory
-        self.memory.release(job.current_size)
-        job.swap_size = job.current_size
-        job.current_size = 0
-        self.run_queue.remove(job)
+        if job.current_size > 0:
+            self._swap_out(job)
+        # If job is in the host memory, its tokens leave over the host link
+        host = self.device.host_memory
+        if host is not None and host.holds(job.job_id):
+            job.ready_time = host.transfer(host.load(job.job_id))
+        self.remove_job(job)
         return True
 
-    def _get_expected_memory(self):
+    @property
+    def committed_tokens(self) -> int:
         """
-        Calculate the expected memory usage of the run queue.
-        Includes currently running jobs and jobs that are not yet running.
-        :return: Total expected memory usage.
+        Memory held by the resident jobs of the run queue.
         """
-        total_expected_memory = 0
-        for job in self.run_queue:
-            if job.current_size == 0:
-                total_expected_memory += job.init_size
-            else:
-                total_expected_memory += job.current_size
-        return total_expected_memory
+        return self._committed_tokens
+
+    @property
+    def expected_tokens(self) -> int:
+        """
+        Expected memory usage of the run queue.
+        Includes currently running jobs and jobs that are not yet running (at their initial size).
+        """
+        return self._expected_tokens
+
+    @property
+    def headroom(self) -> int:
+        """
+        Memory left below the safe capacity once the run queue gets its expected memory,
+        i.e., the largest new job this scheduler admits right away.
+        """
+        return self.memory.safe_capacity - self.expected_tokens
 
     @property
     def num_jobs(self):
         return len(self.run_queue)
 
     def __str__(self):
-        return f"{self.name}: Batch Size {self.batch}, {self.num_jobs} to run."
\ No newline at end of file
+        s = f"{self.name}: Batch Size {self.batch}, {self.num_jobs} to run."
+        if self.preemption.mode != Preemption.Mode.FREE or self.preemption.swaps > 0:
+            s += f" {self.preemption}."
+        return s
\ No newline at end of file
@@ -0,0 +1,169 @@
+import logging
+import math
+from Schedulers.BaseScheduler import Scheduler
+from StepCost import StepWork
+from Job import Job
+
+class BatchPre(Scheduler):
+    """
+    A First-Come-First-Serve Scheduler specialized for prefilling memory, running several prompts per iteration.
+    - Every iteration takes `chunk_time` steps and prefills up to `token_budget` tokens,
+      shared by up to `batch` prompts in arrival order: short prompts are packed together,
+      long prompts are split into chunks over several iterations.
+    - A prompt is admitted when the memory can hold it below the threshold, and holds its tokens until prefilled.
+      A prompt moved here with its completed chunks waits for their tokens (see Preemption.migrate).
+    - Every prompt is handed back to the global scheduler as soon as the iteration completing it ends.
+    """
+    def __init__(self, env, device, memory, token_budget, chunk_time=1, batch=16):
+        super().__init__(env, device, memory, batch, "Batch-Pre")
+        if token_budget <= 0:
+            raise ValueError("Token budget must be positive.")
+        self.token_budget = token_budget
+        self.chunk_time = chunk_time
+        self.admitted: dict[Job, None] = {}  # Prompts holding their memory, an ordered set
+        self.iteration: list[tuple[Job, int]] = []  # Prompts of the current iteration, with their chunk
+        self.iteration_time = 0
+
+    def remove_job(self, job : Job):
+        """
+        Override the remove_job method to forget the admission of the job.
+        """
+        super().remove_job(job)
+        self.admitted.pop(job, None)
+
+    def step(self) -> list[Job]:
+        """
+        We have to override the entire step method to handle the prefill stage.
+        """
+        logging.debug(f"{self.device.name} >> {self.memory}")
+
+        if self.iteration:
+            # If this iteration is in progress --> Continue & Return
+            if self.iteration_time < self.chunk_time:
+                self.iteration_time += 1
+                jobs = [job for job, _ in self.iteration]
+                Job.advance_batch(jobs, self.env.now)
+                logging.debug(f"{self.device.name} >> Prefilling {len(jobs)} prompts for {self.iteration_time}/{self.chunk_time} steps...")
+                return jobs
+            # This iteration is done --> Hand back the complete prompts & Pack the next iteration
+            self._complete_iteration()
+
+        # If nothing in queue, Return
+        if len(self.run_queue) == 0:
+            logging.debug(f"{self.device.name} >> No jobs to run - Empty run queue.")
+            return []
+
+        budget = self.token_budget
+        for job in self.run_queue:
+            if budget <= 0 or len(self.iteration) >= self.batch:
+                break
+            # Moved prompts waiting for their tokens are skipped
+            if job not in self.admitted and self._is_stalled(job, self.env.now):
+                continue
+            # New prompts wait in order for the memory to hold them
+            if job not in self.admitted and not self._admit(job):
+                break
+            chunk = min(job.init_size - job.prefilled_size, budget)
+            budget -= chunk
+            self.iteration.append((job, chunk))
+
+        if not self.iteration:
+            logging.debug(f"{self.device.name} >> No jobs to run - Memory near full or waiting for prefilled tokens.")
+            return []
+
+        self.iteration_time = 1
+        jobs = [job for job, _ in self.iteration]
+        Job.advance_batch(jobs, self.env.now)
+        logging.debug(f"{self.device.name} >> Prefilling {self.token_budget - budget} tokens of {len(jobs)} prompts...")
+        return jobs
+
+    def _admit(self, job: Job) -> bool:
+        """
+        Allocate the memory of a prompt, if it fits below the memory threshold.
+        The prefix found in the cache and the tokens prefilled before the job moved here are not prefilled again.
+        """
+        if self.memory.occupied_tokens + self.memory.footprint(job.init_size) > self.memory.safe_capacity:
+            return False
+        if not self.memory.request(job.init_size, owner=job.job_id, prefix=job.prefix):
+            logging.warning(f"{self.device.name} >> Job({job.job_id}) failed to allocate {job.init_size} tokens.")
+            return False
+        self.admitted[job] = None
+        job.state = Job.State.PREFILL
+        job.prefilled_size = max(job.prefilled_size, self.memory.shared_tokens(job.job_id))
+        logging.debug(f"{self.device.name} >> Job({job.job_id}) start prefilling {job.init_size - job.prefilled_size} tokens...")
+        return True
+
+    def _complete_iteration(self) -> None:
+        """
+        Account the chunks of the iteration that ended, and hand back the prompts it completed.
+        """
+        for job, chunk in self.iteration:
+            job.prefilled_size += chunk
+            if job.prefilled_size < job.init_size:
+                continue
+            logging.debug(f"{self.device.name} >> Job({job.job_id}) prefill complete.")
+            # Cleanup local resources
+            self.memory.release(job.init_size, owner=job.job_id)
+            self.remove_job(job)
+            # Hand back to the global scheduler
+            job.state = Job.State.DECODE
+            job.prefill_finish_time = self.env.now
+            self.device.global_scheduler.receive_job(job)
+        self.iteration = []
+        self.iteration_time = 0
+
+    def step_work(self, jobs: list[Job]) -> StepWork:
+        """
+        Override the step_work method: the chunks of an iteration are prefilled evenly over its steps.
+        """
+        if not jobs:
+            return StepWork()
+        return StepWork(prefill_tokens=sum(chunk for _, chunk in self.iteration) / self.chunk_time)
+
+    def steps_until_event(self) -> int|float:
+        """
+        Override the steps_until_event method: nothing happens until the current iteration ends.
+        """
+        if not self.iteration:
+            return math.inf if len(self.run_queue) == 0 else 0
+        return max(self.chunk_time - self.iteration_time, 0)
+
+    def fast_forward(self, steps: int) -> None:
+        """
+        Override the fast_forward method to keep running the current iteration.
+        """
+        if self.iteration:
+            self.iteration_time += steps
+            Job.advance_batch([job for job, _ in self.iteration], self.env.now + 1, steps)
+
+    def pick_movable_job(self, expected_stages: list[Job.State]) -> Job|None:
+        """
+        Override the pick_movable_job method for prefill specific behavior.
+        Prompts holding their memory are not moved, the first one waiting for admission is.
+        """
+        if Job.State.PREFILL not in expected_stages:
+            return None
+        for job in self.run_queue:
+            if job not in self.admitted:
+                return job
+        return None
+
+    def preempt_job(self, job : Job) -> bool:
+        """
+        Override the preempt_job method to adopt the prefill specific behavior.
+        """
+        # We do not support preemption of an admitted prompt
+        if job not in self.run_queue or job in self.admitted:
+            return False
+        # We do not need to free up memory for a job that is not running
+        self.remove_job(job)
+        return True
+
+    def pick_next_task(self):
+        pass
+
+    def __str__(self):
+        """
+        Override the __str__ method to include the token budget.
+        """
+        return f"{self.name}: Token Budget {self.token_budget} ~ {self.chunk_time} steps, Batch Size {self.batch}, {self.num_jobs} to run."
@@ -0,0 +1,235 @@
+import logging
+import math
+from Schedulers.BaseScheduler import Scheduler
+from RingQueue import RingQueue
+from StepCost import StepWork
+from Job import Job
+
+class ContinuousBatching(Scheduler):
+    """
+    A continuous-batching scheduler for Mixed devices, building every step from a budget of `token_budget` tokens.
+    - Decodes come first: up to `batch` decoding jobs produce one token each, in the order they started decoding.
+      Swapped out jobs are swapped back in before the jobs after them run.
+    - The rest of the budget is filled with prefill chunks of the prompts in arrival order,
+      at most `chunk_size` tokens per prompt and per step (chunked prefill piggybacking on the decodes).
+    - A prompt is admitted when the memory can hold it below the threshold, and holds its tokens while it is prefilled.
+      A prompt moved here with its completed chunks waits for their tokens (see Preemption.migrate).
+      Once prefilled, it starts decoding on this device.
+    - When the decodes cannot grow, the last admitted jobs are preempted: prompts drop their progress,
+      decoding jobs are swapped out following the preemption policy.
+    """
+    def __init__(self, env, device, memory, batch, token_budget, chunk_size=None, preemption=None):
+        super().__init__(env, device, memory, batch, f"CB{token_budget}", preemption)
+        if token_budget <= 0:
+            raise ValueError("Token budget must be positive.")
+        self.token_budget = token_budget
+        self.chunk_size = chunk_size if chunk_size is not None else token_budget
+        self.prompts = RingQueue()  # Jobs to prefill, in arrival order
+        self.decodes = RingQueue()  # Jobs to decode, in the order they started decoding
+        self._work = StepWork()
+        # Statistics
+        self.prefilled_tokens = 0
+        self.preemptions = 0
+
+    def add_job(self, job : Job) -> bool:
+        """
+        Override the add_job method to queue the job for prefill or decode.
+        """
+        super().add_job(job)
+        if job.state == Job.State.DECODE:
+            self.decodes.append(job)
+        else:
+            self.prompts.append(job)
+        return True
+
+    def remove_job(self, job : Job):
+        """
+        Override the remove_job method to drop the job from its queue.
+        """
+        super().remove_job(job)
+        if job in self.decodes:
+            self.decodes.remove(job)
+        else:
+            self.prompts.remove(job)
+
+    def step(self) -> list[Job]:
+        """
+        We have to override the entire step method to share the token budget between decodes and prefills.
+        """
+        self._hand_back_finished()
+        self._work = StepWork()
+
+        if not self.run_queue:
+            logging.info(f"{self.device.name} >> No jobs to run - Empty run queue.")
+            return []
+
+        logging.debug(f"{self.device.name} >> {self.memory}")
+
+        decode_jobs = self._pick_decodes()
+        chunks = self._pick_prefills(self.token_budget - len(decode_jobs))
+        picked_jobs = decode_jobs + [job for job, _ in chunks]
+
+        # Run the whole batch for 1 step, the decodes grow by one token
+        for job in self._advance_batch(picked_jobs, self.env.now):
+            logging.info(f"{self.device.name} >> Job({job.job_id}) finished.")
+
+        # Prompts prefilled in this step start decoding in the next one
+        for job, chunk in chunks:
+            job.prefilled_size += chunk
+            self.prefilled_tokens += chunk
+            if job.prefilled_size >= job.init_size:
+                logging.debug(f"{self.device.name} >> Job({job.job_id}) prefill complete.")
+                job.state = Job.State.DECODE
+                job.prefill_finish_time = self.env.now
+                self.prompts.remove(job)
+                self.decodes.append(job)
+                # A job without any output to generate is finished as soon as it is prefilled
+                if job.is_finished:
+                    job.decode_start_time = job.decode_finish_time = self.env.now
+                    self._finished[job] = None
+
+        self._work = StepWork(batch_size=len(decode_jobs),
+                              context_tokens=sum(job.current_size for job in decode_jobs),
+                              prefill_tokens=sum(chunk for _, chunk in chunks))
+        return picked_jobs
+
+    def _pick_decodes(self) -> list[Job]:
+        """
+        Pick the decoding jobs of this step, and reserve their next token.
+        Jobs are preempted from the end of the eviction order until the picked ones can grow.
+        """
+        ready_jobs = []
+        for job in self.decodes.head(min(self.batch, self.token_budget)):
+            if job.current_size == 0:
+                size = max(job.swap_size, job.init_size)
+                # Swap out the last admitted jobs until we can swap in
+                if not self._free_memory(size, after=job) or not self.memory.request(size, owner=job.job_id, prefix=job.prefix):
+                    logging.warning(f"{self.device.name} >> Job({job.job_id}) waiting for {size} memory... Swap failed.")
+                    break
+                self._swap_in(job, size)
+            # A job restoring its tokens keeps its place but does not run
+            if self._is_stalled(job, self.env.now):
+                continue
+            ready_jobs.append(job)
+        # Swapping in may have swapped out a job picked before
+        ready_jobs = [job for job in ready_jobs if job.current_size > 0]
+
+        granted = self.memory.reserve(1, owners=[job.job_id for job in ready_jobs])
+        picked_jobs, pending_jobs = ready_jobs[:granted], ready_jobs[granted:]
+        while pending_jobs:
+            victim = self._next_victim(picked_jobs)
+            if victim is None or not self._evict(victim):
+                break
+            self.preemptions += 1
+            logging.debug(f"{self.device.name} >> Job({victim.job_id}) preempted...")
+            if victim in pending_jobs:
+                pending_jobs.remove(victim)
+            granted = self.memory.reserve(1, owners=[job.job_id for job in pending_jobs])
+            picked_jobs += pending_jobs[:granted]
+            pending_jobs = pending_jobs[granted:]
+        for job in pending_jobs:
+            logging.warning(f"{self.device.name} >> Job({job.job_id}) waiting for 1 memory... Run failed.")
+        return picked_jobs
+
+    def _next_victim(self, protected: list[Job]) -> Job|None:
+        """
+        The first resident job in eviction order, other than the `protected` jobs and the jobs restoring their tokens.
+        """
+        protected = set(protected)
+        for job in self._residents.ordered():
+            if job not in protected and not self._is_stalled(job, self.env.now):
+                return job
+        return None
+
+    def _pick_prefills(self, budget: int) -> list[tuple[Job, int]]:
+        """
+        Fill `budget` tokens with prefill chunks, admitting new prompts while the memory can hold them.
+        :return: The prompts of this step, with the number of tokens prefilled for each.
+        """
+        chunks = []
+        for job in self.prompts:
+            if budget <= 0:
+                break
+            # Moved prompts waiting for their tokens are skipped
+            if job.current_size == 0 and self._is_stalled(job, self.env.now):
+                continue
+            if job.current_size == 0 and not self._admit(job):
+                break
+            chunk = min(job.init_size - job.prefilled_size, budget, self.chunk_size)
+            budget -= chunk
+            chunks.append((job, chunk))
+        return chunks
+
+    def _admit(self, job: Job) -> bool:
+        """
+        Allocate the memory of a prompt, if it fits below the memory threshold.
+        The prefix found in the cache and the tokens prefilled before the job moved here are not prefilled again.
+        """
+        if self.memory.occupied_tokens + self.memory.footprint(job.init_size) > self.memory.safe_capacity:
+            return False
+        if not self.memory.request(job.init_size, owner=job.job_id, prefix=job.prefix):
+            return False
+        self._account(job, -1)
+        job.current_size = job.init_size
+        self._account(job, 1)
+        self._residents.push(job, self._eviction_key(job))
+        job.state = Job.State.PREFILL
+        job.prefilled_size = max(job.prefilled_size, self.memory.shared_tokens(job.job_id))
+        logging.debug(f"{self.device.name} >> Job({job.job_id}) start prefilling {job.init_size - job.prefilled_size} tokens...")
+        return True
+
+    def _evict(self, job: Job) -> bool:
+        """
+        Override the _evict method: a prompt drops its memory and its progress, it will be prefilled again.
+        """
+        if job.state == Job.State.DECODE:
+            return super()._evict(job)
+        self.memory.release(job.current_size, owner=job.job_id)
+        self._account(job, -1)
+        job.current_size = 0
+        job.prefilled_size = 0
+        self._account(job, 1)
+        self._residents.remove(job)
+        return True
+
+    def step_work(self, jobs: list[Job]) -> StepWork:
+        """
+        Override the step_work method with the decodes and the prefill chunks of the last step.
+        """
+        return self._work
+
+    def steps_until_event(self) -> int|float:
+        """
+        Override the steps_until_event method: without prompts, the same decodes keep running until an event.
+        """
+        if not self.run_queue:
+            return math.inf
+        if self.prompts:
+            return 0
+        return self._stable_steps(self.decodes.head(min(self.batch, self.token_budget)))
+
+    def fast_forward(self, steps: int) -> None:
+        """
+        Override the fast_forward method to keep running the decodes.
+        """
+        self._fast_forward_batch(self.decodes.head(min(self.batch, self.token_budget)), steps)
+
+    def preempt_job(self, job : Job) -> bool:
+        """
+        Override the preempt_job method: a prompt moved away drops its progress.
+        """
+        if job in self.run_queue and job.state != Job.State.DECODE and job.current_size > 0:
+            self._evict(job)
+        return super().preempt_job(job)
+
+    def pick_next_task(self):
+        pass
+
+    def __str__(self):
+        """
+        Override the __str__ method to include the token budget and the preemptions.
+        """
+        return (
+            f"{self.name}: Batch Size {self.batch}, Token Budget {self.token_budget} (Chunk {self.chunk_size}), "
+            f"{self.num_jobs} to run, {self.prefilled_tokens} tokens prefilled, {self.preemptions} preemptions."
+        )
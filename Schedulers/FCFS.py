@@ -1,27 +1,37 @@
+import math
 from Schedulers.BaseScheduler import Scheduler
 
 class FCFS(Scheduler):
     """
     A First-Come-First-Serve Scheduler.
     """
-    def __init__(self, env, device, memory, batch):
-        super().__init__(env, device, memory, batch,"FCFS")
+    def __init__(self, env, device, memory, batch, preemption=None):
+        super().__init__(env, device, memory, batch,"FCFS", preemption)
 
     def pick_next_task(self):
         # Every time, pick the first batch jobs in the queue
         chosen_jobs = []
         memory_available = self.memory.available_tokens
-        for i in range(min(self.num_jobs, self.batch)):
-            if self.run_queue[i].current_size > 0:
-                chosen_jobs.append(self.run_queue[i])
+        for job in self.run_queue.head(self.batch):
+            if job.current_size > 0:
+                chosen_jobs.append(job)
                 memory_available -= 1
             else:
                 # Job has not been allocated memory yet
-                if memory_available > self.run_queue[i].init_size:
-                    memory_available -= self.run_queue[i].init_size
-                    chosen_jobs.append(self.run_queue[i])
+                if memory_available > job.init_size:
+                    memory_available -= job.init_size
+                    chosen_jobs.append(job)
                 else:
                     # Not enough memory to run this job, we need to wait
                     break
 
         return chosen_jobs
+
+    def steps_until_event(self):
+        if not self.run_queue:
+            return math.inf
+        # FCFS picks the same prefix of the queue until a job finishes or a new job fits in memory
+        return self._stable_steps(self.pick_next_task())
+
+    def fast_forward(self, steps):
+        self._fast_forward_batch(self.pick_next_task(), steps)
@@ -2,18 +2,39 @@ import logging
 import math
 from Schedulers.BaseScheduler import Scheduler
 from Job import Job
+from StepCost import StepWork
+from Preemption import Preemption
 
 class FCFSPre(Scheduler):
     """
     A First-Come-First-Serve Scheduler specialized for prefilling memory.
+    The prompt in progress can be moved to another device with its completed chunks,
+    the preemption policy prices the transfer of their tokens (see Preemption.migrate).
     """
-    def __init__(self, env, device, memory, chunk_size, chunk_time):
-        super().__init__(env, device, memory, 1,"FCFS-Pre")
+    def __init__(self, env, device, memory, chunk_size, chunk_time, preemption=None):
+        super().__init__(env, device, memory, 1,"FCFS-Pre", preemption)
         self.chunk_size = chunk_size
         self.chunk_time = chunk_time
         self.cur_job: Job|None = None
         self.cur_job_time = 0
         self.cur_job_expected_time = 0
+        self.cur_job_tokens = 0
+
+    def _reset(self) -> None:
+        """
+        Forget the prompt in progress.
+        """
+        self.cur_job = None
+        self.cur_job_time = 0
+        self.cur_job_expected_time = 0
+        self.cur_job_tokens = 0
+
+    def _prefilled_tokens(self) -> int:
+        """
+        Prompt tokens of the prompt in progress prefilled so far, counting its completed chunks on this device.
+        """
+        chunks = self.cur_job_time // self.chunk_time
+        return min(self.cur_job.prefilled_size + chunks * self.chunk_size, self.cur_job.init_size)
 
     def step(self) -> list[Job]:
         """
@@ -26,16 +47,15 @@ class FCFSPre(Scheduler):
             if self.cur_job_time >= self.cur_job_expected_time:
                 logging.debug(f"{self.device.name} >> Job({self.cur_job.job_id}) prefill complete.")
                 # Cleanup local resources
-                self.memory.release(self.cur_job.init_size)
+                self.memory.release(self.cur_job.init_size, owner=self.cur_job.job_id)
                 self.remove_job(self.cur_job)
                 # Hand back to the global scheduler
                 self.cur_job.state = Job.State.DECODE
                 self.cur_job.prefill_finish_time = self.env.now
+                self.cur_job.prefilled_size = self.cur_job.init_size
                 self.device.global_scheduler.receive_job(self.cur_job)
                 # Reset local state
-                self.cur_job = None
-                self.cur_job_time = 0
-                self.cur_job_expected_time = 0
+                self._reset()
             else:
                 self.cur_job_time += 1
                 self.cur_job.advance(self.env.now)
@@ -47,49 +67,99 @@ class FCFSPre(Scheduler):
             logging.debug(f"{self.device.name} >> No jobs to run - Empty run queue.")
             return []
 
-        # Start the next job in the queue
-        self.cur_job = self.run_queue[0]
+        # Start the next job in the queue, moved prompts wait for their tokens
+        self.cur_job = next((job for job in self.run_queue if not self._is_stalled(job, self.env.now)), None)
+        if self.cur_job is None:
+            logging.debug(f"{self.device.name} >> No jobs to run - Waiting for prefilled tokens.")
+            return []
 
         # Allocate memory for this job
-        if not self.memory.request(self.cur_job.init_size):
+        if not self.memory.request(self.cur_job.init_size, owner=self.cur_job.job_id, prefix=self.cur_job.prefix):
             logging.warning(f"{self.device.name} >> Job({self.cur_job.job_id}) failed to allocate {self.cur_job.init_size} tokens.")
+            self.cur_job = None
             return []
 
         self.cur_job.state = Job.State.PREFILL
         self.cur_job.advance(self.env.now)
         self.cur_job_time = 0
 
-        # Calculate the expected time for this job
-        iterations = int(math.ceil(self.cur_job.init_size / self.chunk_size))
+        # Calculate the expected time for this job, the prefix found in the cache and the tokens prefilled
+        # before the job moved here are not computed again
+        self.cur_job.prefilled_size = max(self.cur_job.prefilled_size, self.memory.shared_tokens(self.cur_job.job_id))
+        uncached_size = self.cur_job.init_size - self.cur_job.prefilled_size
+        self.cur_job_tokens = uncached_size
+        iterations = int(math.ceil(uncached_size / self.chunk_size))
         self.cur_job_expected_time = iterations * self.chunk_time
         logging.debug(f"{self.device.name} >> Job({self.cur_job.job_id}) start prefilling for {self.cur_job_expected_time} steps...")
         return [self.cur_job]
 
+    def steps_until_event(self) -> int|float:
+        """
+        Override the steps_until_event method: nothing happens until the current prompt finishes its last chunk.
+        With the AUTO preemption policy, every chunk may change how the prompt would move (see pick_movable_job).
+        """
+        if self.cur_job is None:
+            return math.inf if len(self.run_queue) == 0 else 0
+        steps = self.cur_job_expected_time - self.cur_job_time
+        if self.preemption.mode == Preemption.Mode.AUTO:
+            steps = min(steps, self.chunk_time - self.cur_job_time % self.chunk_time)
+        return max(steps, 0)
+
+    def fast_forward(self, steps: int) -> None:
+        """
+        Override the fast_forward method to keep prefilling the current prompt.
+        """
+        if self.cur_job is not None:
+            self.cur_job_time += steps
+            self.cur_job.advance(self.env.now, steps)
+
+    def step_work(self, jobs: list[Job]) -> StepWork:
+        """
+        Override the step_work method: the prompt is prefilled evenly over the steps running it.
+        """
+        if not jobs or self.cur_job is None:
+            return StepWork()
+        return StepWork(prefill_tokens=self.cur_job_tokens / (self.cur_job_expected_time + 1))
+
     def pick_movable_job(self, expected_stages: list[Job.State]) -> Job|None:
         """
         Override the pick_movable_job method for prefill specific behavior.
-        We do not know how to move a Prefill stage job.
-        But due to the FCFS nature, all non-running jobs are movable.
+        Due to the FCFS nature, all waiting jobs are movable and have no tokens to transfer,
+        except the prompts started on another device, which stay.
+        Without waiting jobs, the prompt in progress is movable if the preemption policy carries its tokens,
+        and a device keeps its last prompt, so that it does not bounce between devices.
         """
-        if len(self.run_queue) == 0 or Job.State.PREFILL not in expected_stages:
+        if len(self.run_queue) <= 1 or Job.State.PREFILL not in expected_stages:
             return None
         for i, job in enumerate(self.run_queue):
-            if job == self.cur_job:
+            if job == self.cur_job or job.prefill_start_time is not None:
                 continue
             if i < self.batch:
                 continue
             return job
-        return None
+        # A complete prompt is handed back in the next step
+        if self.cur_job is None or self.cur_job_time >= self.cur_job_expected_time:
+            return None
+        if self.preemption.migrate_mode(self._prefilled_tokens()) == Preemption.Mode.RECOMPUTE:
+            return None
+        return self.cur_job
 
     def preempt_job(self, job : Job) -> bool:
         """
         Override the preempt_job method to adopt the prefill specific behavior.
+        The prompt in progress leaves with its completed chunks and releases its memory.
         """
-        # We do not support preemption in the prefill stage
-        if job == self.cur_job:
+        if job not in self.run_queue:
             return False
-        # We do not need to free up memory for a job that is not running
-        self.run_queue.remove(job)
+        if job == self.cur_job:
+            # A complete prompt is handed back in the next step
+            if self.cur_job_time >= self.cur_job_expected_time:
+                return False
+            self.memory.release(job.init_size, owner=job.job_id)
+            job.prefilled_size = self._prefilled_tokens()
+            self._reset()
+        self._migrate(job)
+        self.remove_job(job)
         return True
 
     def pick_next_task(self):
@@ -99,4 +169,7 @@ class FCFSPre(Scheduler):
         """
         Override the __str__ method to include the prefill chunk size and time.
         """
-        return f"{self.name}: Chunk (Size {self.chunk_size} ~ {self.chunk_time} steps), {self.num_jobs} to run."
\ No newline at end of file
+        s = f"{self.name}: Chunk (Size {self.chunk_size} ~ {self.chunk_time} steps), {self.num_jobs} to run."
+        if self.preemption.mode != Preemption.Mode.FREE:
+            s += f" {self.preemption}."
+        return s
\ No newline at end of file
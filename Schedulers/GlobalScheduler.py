@@ -1,33 +1,53 @@
+import heapq
+import math
 import logging
 
 from Device import Device
 from Job import Job
-
-
-def print_devices(devices: list[Device]) -> str:
-    msg = "Devices:\t"
-    for d in devices:
-        msg += f"{d.name}({d.tag}) {d.workload:.4f}\t"
-    return msg
+from IndexedHeap import IndexedHeap
+from Dispatch import DispatchPolicy
 
 
 class GlobalScheduler:
     """
     Global scheduler that dispatches jobs to a pool of devices.
+
+    The workload of every device is cached, a device refreshes it when its queue or memory changed (see update_workload).
+    From INDEX_MIN_DEVICES devices on, the devices are also indexed by workload per operational mode,
+    in two heaps (lightest and heaviest first), so that dispatching a job costs O(log D) instead of sorting the devices.
+    Smaller clusters are sorted by their cached workload, which is cheaper than maintaining the heaps.
+    Ties are broken by the order the devices were added in, as a stable sort of the device list would.
+
+    The queued jobs are dispatched all at once at every step by a dispatch policy (see Dispatch.py),
+    the ones that cannot be placed stay queued in arrival order.
     """
+    INDEX_MIN_DEVICES = 32
 
-    def __init__(self, devices: list[Device], load_balance_round=0):
+    def __init__(self, devices: list[Device], load_balance_round=0, dispatch: DispatchPolicy|None = None):
         """
         Parameters:
           - devices: A list of Device instances.
+          - load_balance_round: Number of proactive load balancing rounds per step.
+          - dispatch: How the queued jobs are assigned to the devices, the least loaded device by default.
         """
         self.load_balance_round = load_balance_round
+        self.dispatch : DispatchPolicy = dispatch if dispatch is not None else DispatchPolicy()
         self.devices = devices
-        for d in self.devices:
-            d.set_global_scheduler(self)
         self.queue: list[Job] = []
         self.finished_jobs: list[Job] = []
         self.statistics = dict.fromkeys(self.devices, 0)
+        # Cached workloads, and the workload index keyed by (workload, rank) and (-workload, rank)
+        self._workloads: dict[Device, float] = {}
+        self._lightest = {mode: IndexedHeap() for mode in Device.Mode}
+        self._heaviest = {mode: IndexedHeap() for mode in Device.Mode}
+        self._indexed = False
+        self._ranks: dict[Device, int] = {}
+        self._added = 0
+        # Devices per mode, in the order they were added
+        self.devices_by_mode: dict[Device.Mode, list[Device]] = {mode: [] for mode in Device.Mode}
+        for d in self.devices:
+            d.set_global_scheduler(self)
+            self._index(d)
 
     def add_device(self, device: Device):
         """
@@ -35,6 +55,7 @@ class GlobalScheduler:
         """
         self.devices.append(device)
         device.set_global_scheduler(self)
+        self._index(device)
         if device not in self.statistics:
             self.statistics[device] = 0
         logging.info(f"G-S >> Added device '{device.name}'")
@@ -45,24 +66,106 @@ class GlobalScheduler:
         """
         if device in self.devices:
             self.devices.remove(device)
+            rank = self._ranks.pop(device, None)
+            if rank is not None:
+                del self._workloads[device]
+                self.devices_by_mode[device.tag].remove(device)
+                if self._indexed:
+                    self._lightest[device.tag].remove(device)
+                    self._heaviest[device.tag].remove(device)
             logging.info(f"G-S >> Removed device '{device.name}'")
 
-    def _dispatch_job(self, job: Job) -> Device|None:
+    def update_workload(self, device: Device) -> None:
+        """
+        Refresh the cached workload of a device after its queue or memory changed,
+        and re-index it in O(log D) if its workload moved.
+        """
+        workload = device.workload
+        if self._workloads.get(device, workload) == workload:
+            return
+        self._workloads[device] = workload
+        if self._indexed:
+            rank = self._ranks[device]
+            self._lightest[device.tag].update(device, (workload, rank))
+            self._heaviest[device.tag].update(device, (-workload, rank))
+
+    def _index(self, device: Device) -> None:
+        """
+        Add a device to the workload index, after the devices already there.
+        The heaps are built once the cluster reaches INDEX_MIN_DEVICES devices.
+        """
+        if device in self._ranks:
+            return
+        rank = self._added
+        self._added += 1
+        self._ranks[device] = rank
+        self.devices_by_mode[device.tag].append(device)
+        self._workloads[device] = device.workload
+        if self._indexed:
+            self._push(device)
+        elif len(self._ranks) >= GlobalScheduler.INDEX_MIN_DEVICES:
+            self._indexed = True
+            for d in self._ranks:
+                self._push(d)
+
+    def _push(self, device: Device) -> None:
+        workload, rank = self._workloads[device], self._ranks[device]
+        self._lightest[device.tag].push(device, (workload, rank))
+        self._heaviest[device.tag].push(device, (-workload, rank))
+
+    def rank(self, device: Device) -> int:
         """
-        Select a device based on the current workload and dispatch the job to it.
-        Returns the selected device.
+        Order in which the device was added, used to break ties.
         """
-        capable_devices = self._get_capable_devices(job)
-        sorted_devices = sorted(capable_devices, key=lambda d: d.workload)
-        logging.debug(f"G-S >> Capable {print_devices(sorted_devices)}")
-        for sd in sorted_devices:
-            if sd.add_job(job):
-                logging.debug(f"G-S >> Dispatched Job({job.job_id}) to '{sd.name}'")
-                self.statistics[sd] += 1
-                return sd
+        return self._ranks[device]
 
-        logging.warning(f"G-S >> No capable device found for Job({job.job_id})")
-        return None
+    def by_workload(self, modes, heaviest: bool = False):
+        """
+        Iterate lazily over the devices of `modes`, the lightest (or the heaviest) first.
+        The index must not change during the iteration.
+        """
+        workloads, ranks = self._workloads, self._ranks
+        if not self._indexed:
+            devices = [d for mode in modes for d in self.devices_by_mode[mode]]
+            if heaviest:
+                return iter(sorted(devices, key=lambda d: (-workloads[d], ranks[d])))
+            return iter(sorted(devices, key=lambda d: (workloads[d], ranks[d])))
+        index = self._heaviest if heaviest else self._lightest
+        heaps = [index[mode] for mode in modes if index[mode]]
+        if len(heaps) == 1:
+            return heaps[0].ordered()
+        return heapq.merge(*(heap.ordered() for heap in heaps), key=lambda d: index[d.tag].key(d))
+
+    def _lightest_device(self, modes) -> Device|None:
+        """
+        The lightest device of `modes` that is not warming up, the last added one among equally loaded devices.
+        """
+        workloads = self._workloads
+        lightest = None
+        for d in self.by_workload(modes):
+            if d.is_warming_up:
+                continue
+            if lightest is not None and workloads[d] != workloads[lightest]:
+                break
+            lightest = d
+        return lightest
+
+    def capable_modes(self, job: Job) -> list[Device.Mode]:
+        """
+        Return the operational modes of the devices that can support the job's state.
+        """
+        return [mode for mode, devices in self.devices_by_mode.items() if devices and devices[0].job_state_supported(job)]
+
+    def assign(self, job: Job, device: Device) -> bool:
+        """
+        Dispatch a job to the device chosen by the dispatch policy.
+        :return: True if the device accepted the job.
+        """
+        if not device.add_job(job):
+            return False
+        logging.debug(f"G-S >> Dispatched Job({job.job_id}) to '{device.name}'")
+        self.statistics[device] += 1
+        return True
 
     def receive_job(self, job: Job):
         """
@@ -81,49 +184,101 @@ class GlobalScheduler:
         TODO: When perform multiple rounds, I suspect there will be a bug of moving jobs back and forth.
         """
         moved_jobs = 0
+        workloads = self._workloads
         for _ in range(self.load_balance_round):
             # Check Prefill stage jobs from Prefill-only or Mixed Devices
-            prefill_devices = [d for d in self.devices if (d.tag == Device.Mode.PREFILL or d.tag == Device.Mode.MIXED) and not d.is_warming_up]
-            sorted_pd = sorted(prefill_devices, key=lambda d: d.workload, reverse=True)
-            lightest_prefill = sorted_pd[-1]
-            for heavier_prefill in sorted_pd:
-                if heavier_prefill.workload > 1.2 * lightest_prefill.workload:
-                    victim_job = heavier_prefill.scheduler.pick_movable_job([Job.State.INITIAL, Job.State.PREFILL])
-                    if (
-                            victim_job is not None and
-                            heavier_prefill.scheduler.preempt_job(victim_job) and
-                            lightest_prefill.add_job(victim_job)
-                    ):
-                        moved_jobs += 1
-                        logging.debug(f"G-S >> Moving {victim_job.job_id}(P) from '{heavier_prefill.name}' to '{lightest_prefill.name}'")
-                        break
+            prefill_modes = (Device.Mode.PREFILL, Device.Mode.MIXED)
+            lightest_prefill = self._lightest_device(prefill_modes)
+            for heavier_prefill in self._heavier_devices(prefill_modes, lightest_prefill):
+                if workloads[heavier_prefill] <= 1.2 * workloads[lightest_prefill]:
+                    break
+                victim_job = heavier_prefill.scheduler.pick_movable_job([Job.State.INITIAL, Job.State.PREFILL])
+                if victim_job is None or not heavier_prefill.scheduler.preempt_job(victim_job):
+                    continue
+                self.update_workload(heavier_prefill)
+                if lightest_prefill.add_job(victim_job):
+                    moved_jobs += 1
+                    logging.debug(f"G-S >> Moving {victim_job.job_id}(P) from '{heavier_prefill.name}' to '{lightest_prefill.name}'")
+                    break
 
             # Check Decode stage jobs from Decode-only or Mixed Devices
-            decode_devices = [d for d in self.devices if (d.tag == Device.Mode.DECODE or d.tag == Device.Mode.MIXED) and not d.is_warming_up]
-            sorted_dd = sorted(decode_devices, key=lambda d: d.workload, reverse=True)
-            lightest_decode = sorted_dd[-1]
-            for heavier_decode in sorted_dd:
-                if heavier_decode.workload > 1.2 * lightest_decode.workload:
-                    victim_job = heavier_decode.scheduler.pick_movable_job([Job.State.DECODE])
-                    if (
-                            victim_job is not None and
-                            heavier_decode.scheduler.preempt_job(victim_job) and
-                            lightest_decode.add_job(victim_job)
-                    ):
-                        moved_jobs += 1
-                        logging.debug(f"G-S >> Moving {victim_job.job_id}(D) from '{heavier_decode.name}' to '{lightest_decode.name}'")
+            decode_modes = (Device.Mode.DECODE, Device.Mode.MIXED)
+            lightest_decode = self._lightest_device(decode_modes)
+            for heavier_decode in self._heavier_devices(decode_modes, lightest_decode):
+                if workloads[heavier_decode] <= 1.2 * workloads[lightest_decode]:
+                    break
+                victim_job = heavier_decode.scheduler.pick_movable_job([Job.State.DECODE])
+                if victim_job is None or not heavier_decode.scheduler.preempt_job(victim_job):
+                    continue
+                self.update_workload(heavier_decode)
+                if lightest_decode.add_job(victim_job):
+                    moved_jobs += 1
+                    logging.debug(f"G-S >> Moving {victim_job.job_id}(D) from '{heavier_decode.name}' to '{lightest_decode.name}'")
         return moved_jobs
 
+    def _heavier_devices(self, modes, lightest: Device|None) -> list[Device]:
+        """
+        The devices of `modes` that are not warming up and load more than 1.2 times `lightest`, the heaviest first.
+        Moving jobs only makes the lightest device heavier, so no other device can pass the threshold meanwhile.
+        """
+        if lightest is None:
+            return []
+        workloads = self._workloads
+        threshold = 1.2 * workloads[lightest]
+        heavier = []
+        for d in self.by_workload(modes, heaviest=True):
+            if not workloads[d] > threshold:
+                break
+            if not d.is_warming_up:
+                heavier.append(d)
+        return heavier
+
     def step(self):
         """
         Main step function called by the system.
         """
         # Proactively load balance the devices
         self.proactively_load_balance()
-        # Dispatch jobs in the queue
-        for job in self.queue:
-            if self._dispatch_job(job) is not None:
-                self.queue.remove(job)
+        # Dispatch all the jobs in the queue at once
+        if self.queue:
+            self.queue = self.dispatch.dispatch(self, self.queue)
+
+    def steps_until_event(self) -> int|float:
+        """
+        Number of upcoming steps in which neither dispatching nor load balancing has anything to do.
+        """
+        if self.queue and not self.dispatch.is_blocked(self, self.queue):
+            return 0
+        if self.load_balance_round > 0 and self._has_movable_jobs():
+            return 0
+        return math.inf
+
+    def _has_movable_jobs(self) -> bool:
+        """
+        Check if proactively_load_balance() may find a job to move during the upcoming quiet steps.
+        Prefill-only devices keep their workload while prefilling, but running decode batches keep growing,
+        so any movable job on a decode-capable device counts.
+        """
+        groups = [
+            ((Device.Mode.DECODE, Device.Mode.MIXED), [Job.State.DECODE]),
+            ((Device.Mode.PREFILL, Device.Mode.MIXED), [Job.State.INITIAL, Job.State.PREFILL]),
+        ]
+        for modes, stages in groups:
+            candidates = [d for mode in modes for d in self.devices_by_mode[mode] if not d.is_warming_up]
+            if len(candidates) < 2:
+                continue
+            # The lightest workload is only needed for the prefill-only devices, computed on the first one
+            lightest_workload = None
+            for d in candidates:
+                if d.scheduler.pick_movable_job(stages) is None:
+                    continue
+                if d.tag != Device.Mode.PREFILL:
+                    return True
+                if lightest_workload is None:
+                    lightest_workload = self._workloads[self._lightest_device(modes)]
+                if self._workloads[d] > 1.2 * lightest_workload:
+                    return True
+        return False
 
     @property
     def all_devices_busy(self) -> bool:
@@ -133,16 +288,10 @@ class GlobalScheduler:
         Notice:
         - 1.5 is the threshold for busy devices for now. 1.5 = (0.02 * 50 Jobs) + (1.0 * Half Memory Used)
         """
-        return all(d.workload > 1.5 for d in self.devices)
-
-    def _get_capable_devices(self, job: Job) -> list[Device]:
-        """
-        Return a list of devices that can support the job's state.
-        """
-        return [d for d in self.devices if d.job_state_supported(job)]
+        return all(workload > 1.5 for workload in self._workloads.values())
 
     def __str__(self):
-        s = "Global Scheduler\n"
+        s = f"Global Scheduler ({self.dispatch})\n"
         for d, count in self.statistics.items():
             s += f"\t{d.name}({d.tag}) :: dispatched {count} jobs\n"
         return s
\ No newline at end of file
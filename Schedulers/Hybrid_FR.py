@@ -3,15 +3,16 @@ from Schedulers.BaseScheduler import Scheduler
 from Schedulers.FCFS_prefill import FCFSPre
 from Schedulers.RR import RR
 from Job import Job
+from StepCost import StepWork
 
 class HybridFR(Scheduler):
     """
     A Hybrid Scheduler that combines First-Come-First-Serve for Prefill and Round-Robin for Decode.
     """
-    def __init__(self, env, device, memory, chunk_size, chunk_time, collocate_threshold, time_slice=1):
-        super().__init__(env, device, memory, 1,"Hybrid-FR")
-        self.prefill_sched = FCFSPre(env, device, memory, chunk_size, chunk_time)
-        self.decode_sched = RR(env, device, memory, collocate_threshold, time_slice)
+    def __init__(self, env, device, memory, chunk_size, chunk_time, collocate_threshold, time_slice=1, preemption=None):
+        super().__init__(env, device, memory, 1,"Hybrid-FR", preemption)
+        self.prefill_sched = FCFSPre(env, device, memory, chunk_size, chunk_time, self.preemption)
+        self.decode_sched = RR(env, device, memory, collocate_threshold, time_slice, self.preemption)
 
 
     def add_job(self, job : Job) -> bool:
@@ -49,6 +50,34 @@ class HybridFR(Scheduler):
         whole_list += self.decode_sched.step()
         return whole_list
 
+    def steps_until_event(self) -> int|float:
+        """
+        Override the steps_until_event method: the next event of either scheduler.
+        """
+        return min(self.prefill_sched.steps_until_event(), self.decode_sched.steps_until_event())
+
+    def fast_forward(self, steps: int) -> None:
+        """
+        Override the fast_forward method to forward both schedulers.
+        """
+        self.prefill_sched.fast_forward(steps)
+        self.decode_sched.fast_forward(steps)
+
+    def wait(self, time: int, steps: int) -> None:
+        """
+        Override the wait method to let both schedulers wait.
+        """
+        self.prefill_sched.wait(time, steps)
+        self.decode_sched.wait(time, steps)
+
+    def step_work(self, jobs: list[Job]) -> StepWork:
+        """
+        Override the step_work method: the prefill and the decode of a step are collocated.
+        """
+        prefill_jobs = [job for job in jobs if job.state == Job.State.PREFILL]
+        decode_jobs = [job for job in jobs if job.state != Job.State.PREFILL]
+        return self.prefill_sched.step_work(prefill_jobs) + self.decode_sched.step_work(decode_jobs)
+
     @property
     def num_jobs(self):
         """
@@ -56,6 +85,20 @@ class HybridFR(Scheduler):
         """
         return self.prefill_sched.num_jobs + self.decode_sched.num_jobs
 
+    @property
+    def committed_tokens(self) -> int:
+        """
+        Override the committed_tokens property to sum both schedulers.
+        """
+        return self.prefill_sched.committed_tokens + self.decode_sched.committed_tokens
+
+    @property
+    def expected_tokens(self) -> int:
+        """
+        Override the expected_tokens property to sum both schedulers.
+        """
+        return self.prefill_sched.expected_tokens + self.decode_sched.expected_tokens
+
     def pick_movable_job(self, expected_stages: list[Job.State]) -> Job|None:
         """
         Override the pick_movable_job method to pick a job from different stages.
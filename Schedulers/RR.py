@@ -1,4 +1,6 @@
 import logging
+import math
+from collections import deque
 from Schedulers.BaseScheduler import Scheduler
 
 class RR(Scheduler):
@@ -6,27 +8,19 @@ class RR(Scheduler):
     A round-robin scheduler with a time slice.
     But queue new jobs when the memory is (near) full.
     And swap out jobs when the memory is full.
+    The run queue is a ring (O(1) rotation and removal by job id), the wait queue a deque.
     """
-    def __init__(self, env, device, memory, batch, time_slice=1):
-        super().__init__(env, device, memory, batch, f"RR{time_slice}")
+    def __init__(self, env, device, memory, batch, time_slice=1, preemption=None):
+        super().__init__(env, device, memory, batch, f"RR{time_slice}", preemption)
         self.time_slice = time_slice
-        self.wait_queue = []
-
-    def _find_target_job(self):
-        """
-        Find the last job in the run queue that occupies memory.
-        :return: int - index of the job in the run queue
-        """
-        for i in range(len(self.run_queue)-1, 0, -1):
-            if self.run_queue[i].current_size > 0:
-                return i
-        return None
+        self.wait_queue = deque()
+        # A time slice ended while the device was busy with a longer step
+        self._missed_rotation = False
 
     def add_job(self, job):
         # Check if we have enough memory to accept this new job
-        if job.init_size <= self.memory.safe_capacity - self._get_expected_memory():
-            self.run_queue.append(job)
-            return True
+        if job.init_size <= self.memory.safe_capacity - self.expected_tokens:
+            return super().add_job(job)
         else:
             self.wait_queue.append(job)
             logging.debug(f"Job({job.job_id}) blocked due to memory shortage.")
@@ -34,44 +28,53 @@ class RR(Scheduler):
 
     def pick_next_task(self):
         # Unblock waiting jobs if memory is available
-        while self._get_expected_memory() < self.memory.safe_capacity and self.wait_queue:
-            job = self.wait_queue.pop(0)
+        while self.expected_tokens < self.memory.safe_capacity and self.wait_queue:
+            job = self.wait_queue.popleft()
             logging.debug(f"Job({job.job_id}) unblocked thanks to memory availability.")
-            self.run_queue.append(job)
+            super().add_job(job)
 
         selected_jobs = []
-        i = 0
-        while i < min(self.batch, len(self.run_queue)):
-            job = self.run_queue[i]
+        for job in self.run_queue.head(self.batch):
             if job.current_size == 0:
                 assert job.swap_size > 0 or job.init_size > 0
-                can_swap_in = True
+                size = max(job.swap_size, job.init_size)
 
-                # Swap out lowest priority request until we can swap in
-                while not self.memory.request(max(job.swap_size, job.init_size)):
-                    found = False
-                    for j in range(len(self.run_queue)-1, i, -1):
-                        if self.run_queue[j].current_size > 0:
-                            self.memory.release(self.run_queue[j].current_size)
-                            self.run_queue[j].swap_size = self.run_queue[j].current_size
-                            self.run_queue[j].current_size = 0
-                            found = True
-                            break
-                    if not found:
-                        can_swap_in = False
-                        break
-                if can_swap_in:
-                    job.current_size = max(job.swap_size, job.init_size)
-                    job.swap_size = 0
-                else:
+                # Swap out the last resident requests until we can swap in
+                if not self._free_memory(size, after=job) or not self.memory.request(size, owner=job.job_id, prefix=job.prefix):
                     break
+                self._swap_in(job, size)
             selected_jobs.append(job)
-            i += 1
 
         # Each every time slice, we modify the run queue to dequeue the first job and enqueue it at the end.
-        if self.env.now % self.time_slice == 0:
-            for _ in range(self.time_slice):
-                j = self.run_queue.pop(0)
-                self.run_queue.append(j)
+        if self.env.now % self.time_slice == 0 or self._missed_rotation:
+            self._missed_rotation = False
+            for job in self.run_queue.rotate(self.time_slice):
+                self._reorder_resident(job)
+
+        return selected_jobs
+
+    def wait(self, time, steps):
+        """
+        Override the wait method: a time slice ending while the device is busy rotates the queue at the next step.
+        """
+        if self.run_queue and (time + steps - 1) // self.time_slice * self.time_slice >= time:
+            self._missed_rotation = True
+
+    def steps_until_event(self):
+        if not self.run_queue:
+            return math.inf
+        if self._missed_rotation:
+            return 0
+        # Waiting jobs will be unblocked in the next step
+        if self.wait_queue and self.expected_tokens < self.memory.safe_capacity:
+            return 0
+        # Rotating the queue changes the batch, unless it brings the queue back to the same order
+        steps = math.inf
+        if self.time_slice % len(self.run_queue) != 0:
+            steps = self.time_slice - self.env.now % self.time_slice - 1
+        if steps == 0:
+            return 0
+        return min(steps, self._stable_steps(self.run_queue.head(self.batch)))
 
-        return selected_jobs
\ No newline at end of file
+    def fast_forward(self, steps):
+        self._fast_forward_batch(self.run_queue.head(self.batch), steps)
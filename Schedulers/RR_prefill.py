@@ -1,8 +1,12 @@
 import logging
 import math
 from dataclasses import dataclass
+from operator import attrgetter
 from Schedulers.BaseScheduler import Scheduler
+from RingQueue import RingQueue
 from Job import Job
+from StepCost import StepWork
+from Preemption import Preemption
 
 @dataclass
 class Progress:
@@ -18,22 +22,48 @@ class Progress:
 class RRPre(Scheduler):
     """
     A Round-Robin Scheduler specialized for prefilling memory.
+    The run queue is a ring of job progresses indexed by job id.
+    A prompt can be moved to another device with its completed chunks,
+    the preemption policy prices the transfer of their tokens (see Preemption.migrate).
     """
-    def __init__(self, env, device, memory, chunk_size, chunk_time):
-        super().__init__(env, device, memory, 1,"RR-Pre")
+    def __init__(self, env, device, memory, chunk_size, chunk_time, preemption=None):
+        super().__init__(env, device, memory, 1,"RR-Pre", preemption)
         self.chunk_size = chunk_size
         self.chunk_time = chunk_time
-        self.run_queue : list[Progress] = []
+        self.run_queue : RingQueue = RingQueue(key=attrgetter("job.job_id"))
         self.cur_progress: Progress|None = None
 
     def add_job(self, job : Job) -> bool:
         """
         Override the add_job method to include our progress information.
         """
-        time = int(math.ceil(job.init_size / self.chunk_size)) * self.chunk_time
-        self.run_queue.append(Progress(job=job, expected_time=time))
+        self.run_queue.append(Progress(job=job, expected_time=self._prefill_time(job.init_size - job.prefilled_size)))
+        self._account(job, 1)
         return True
 
+    def _prefill_time(self, tokens: int) -> int:
+        """
+        Number of steps to prefill `tokens` tokens, chunk by chunk.
+        """
+        return int(math.ceil(tokens / self.chunk_size)) * self.chunk_time
+
+    def _prefilled_tokens(self, progress: Progress) -> int:
+        """
+        Prompt tokens prefilled so far, counting the completed chunks on this device.
+        """
+        job = progress.job
+        if not progress.memory_allocated:
+            return job.prefilled_size
+        chunks = progress.total_running_time // self.chunk_time
+        return min(job.prefilled_size + chunks * self.chunk_size, job.init_size)
+
+    def remove_job(self, job : Job):
+        """
+        Override the remove_job method, the run queue holds the progress of the jobs.
+        """
+        self.run_queue.pop_key(job.job_id)
+        self._account(job, -1)
+
     def step(self) -> list[Job]:
         """
         We have to override the entire step method to handle the prefill stage.
@@ -46,18 +76,19 @@ class RRPre(Scheduler):
             if self.cur_progress.total_running_time >= self.cur_progress.expected_time:
                 logging.debug(f"{self.device.name} >> Job({self.cur_progress.job.job_id}) prefill complete.")
                 # Cleanup local resources
-                self.memory.release(self.cur_progress.job.init_size)
+                self.memory.release(self.cur_progress.job.init_size, owner=self.cur_progress.job.job_id)
                 self.remove_job(self.cur_progress.job)
                 # Hand back to the global scheduler
                 self.cur_progress.job.state = Job.State.DECODE
                 self.cur_progress.job.prefill_finish_time = self.env.now
+                self.cur_progress.job.prefilled_size = self.cur_progress.job.init_size
                 self.device.global_scheduler.receive_job(self.cur_progress.job)
                 # Reset local state
                 self.cur_progress = None
             # This iteration is done --> Choose next job
             elif self.cur_progress.iter_running_time >= self.chunk_time:
                 self.cur_progress.iter_running_time = 0
-                self.run_queue.append(self.run_queue.pop(0))
+                self.run_queue.rotate(1)
                 self.cur_progress = None
             # If this iteration is in progress --> Continue & Return
             else:
@@ -81,19 +112,33 @@ class RRPre(Scheduler):
             self.cur_progress = allocated_run_queue[0]
         # If memory is not near full, we can run next job
         else:
+            # Moved prompts waiting for their tokens go to the back of the ring
+            for _ in range(len(self.run_queue)):
+                if not self._is_stalled(self.run_queue[0].job, self.env.now):
+                    break
+                self.run_queue.rotate(1)
+            else:
+                logging.debug(f"{self.device.name} >> No jobs to run - Waiting for prefilled tokens.")
+                return []
             self.cur_progress = self.run_queue[0]
             # If next job not in memory (e.g., a new job), allocate memory for it
             if not self.cur_progress.memory_allocated:
-                if not self.memory.request(self.cur_progress.job.init_size):
-                    logging.warning(f"{self.device.name} >> Job({self.cur_progress.job.job_id}) failed to allocate {self.cur_progress.job.init_size} tokens.")
+                job = self.cur_progress.job
+                if not self.memory.request(job.init_size, owner=job.job_id, prefix=job.prefix):
+                    logging.warning(f"{self.device.name} >> Job({job.job_id}) failed to allocate {job.init_size} tokens.")
+                    self.cur_progress = None
                     return []
-                logging.debug(f"{self.device.name} >> Job({self.cur_progress.job.job_id}) start prefilling for {self.cur_progress.expected_time} steps...")
-            # Update this new Job's state
-            self.cur_progress.job.prefill_start_time = self.env.now
-            self.cur_progress.job.state = Job.State.PREFILL
-            self.cur_progress.memory_allocated = True
-            self.cur_progress.total_running_time = 0
-            self.cur_progress.iter_running_time = 0
+                # The prefix found in the cache and the tokens prefilled before the job moved here are not computed again
+                job.prefilled_size = max(job.prefilled_size, self.memory.shared_tokens(job.job_id))
+                self.cur_progress.expected_time = self._prefill_time(job.init_size - job.prefilled_size)
+                logging.debug(f"{self.device.name} >> Job({job.job_id}) start prefilling for {self.cur_progress.expected_time} steps...")
+                # Update this new Job's state, a job coming back after its time slice keeps its progress
+                if job.prefill_start_time is None:
+                    job.prefill_start_time = self.env.now
+                job.state = Job.State.PREFILL
+                self.cur_progress.memory_allocated = True
+                self.cur_progress.total_running_time = 0
+                self.cur_progress.iter_running_time = 0
 
         # No matter what, we now have a job to run
         self.cur_progress.job.advance(self.env.now)
@@ -102,21 +147,74 @@ class RRPre(Scheduler):
         logging.debug(f"{self.device.name} >> Job({self.cur_progress.job.job_id}) prefilling for {self.cur_progress.total_running_time}/{self.cur_progress.expected_time} steps...")
         return [self.cur_progress.job]
 
+    def steps_until_event(self) -> int|float:
+        """
+        Override the steps_until_event method: nothing happens until the current chunk (or prompt) completes.
+        """
+        if self.cur_progress is None or not self.cur_progress.memory_allocated:
+            return math.inf if len(self.run_queue) == 0 else 0
+        return max(min(self.chunk_time - self.cur_progress.iter_running_time,
+                       self.cur_progress.expected_time - self.cur_progress.total_running_time), 0)
+
+    def fast_forward(self, steps: int) -> None:
+        """
+        Override the fast_forward method to keep running the current chunk.
+        """
+        if self.cur_progress is not None:
+            self.cur_progress.total_running_time += steps
+            self.cur_progress.iter_running_time += steps
+
+    def step_work(self, jobs: list[Job]) -> StepWork:
+        """
+        Override the step_work method: a prompt is prefilled evenly over its expected steps.
+        """
+        if not jobs or self.cur_progress is None or self.cur_progress.expected_time == 0:
+            return StepWork()
+        job = self.cur_progress.job
+        return StepWork(prefill_tokens=(job.init_size - job.prefilled_size) / self.cur_progress.expected_time)
+
     def pick_movable_job(self, expected_stages: list[Job.State]) -> Job|None:
         """
         Override the pick_movable_job method for prefill specific behavior.
-        We do not know how to move a Prefill stage job.
+        A device keeps its last prompt, the others are movable except the one running:
+        we prefer prompts not yet started (no tokens to transfer), then the one running last in the ring.
+        A started prompt is only moved if the preemption policy carries its tokens,
+        and a prompt started on another device stays until it ran here, so that it does not bounce between devices.
         """
-        # TODO: Implement this method
-        return None
+        if Job.State.PREFILL not in expected_stages or len(self.run_queue) <= 1:
+            return None
+        started = None
+        for progress in self.run_queue:
+            if progress is self.cur_progress:
+                continue
+            if not progress.memory_allocated:
+                if progress.job.prefill_start_time is None:
+                    return progress.job
+                continue
+            if self.preemption.migrate_mode(self._prefilled_tokens(progress)) != Preemption.Mode.RECOMPUTE:
+                started = progress.job
+        return started
 
     def preempt_job(self, job : Job) -> bool:
         """
         Override the preempt_job method to adopt the prefill specific behavior.
-        We do not know how to move a Prefill stage job.
+        The prompt leaves with its completed chunks and releases its memory.
         """
-        # TODO: Implement this method
-        return False
+        if not self.run_queue.contains_key(job.job_id):
+            return False
+        running = self.cur_progress is not None and self.cur_progress.job is job
+        # A complete prompt is handed back in the next step
+        if running and self.cur_progress.total_running_time >= self.cur_progress.expected_time:
+            return False
+        progress = self.run_queue.pop_key(job.job_id)
+        self._account(job, -1)
+        if running:
+            self.cur_progress = None
+        if progress.memory_allocated:
+            self.memory.release(job.init_size, owner=job.job_id)
+            job.prefilled_size = self._prefilled_tokens(progress)
+        self._migrate(job)
+        return True
 
     def pick_next_task(self):
         pass
@@ -125,4 +223,7 @@ class RRPre(Scheduler):
         """
         Override the __str__ method to include the prefill chunk size and time.
         """
-        return f"{self.name}: Chunk (Size {self.chunk_size} ~ {self.chunk_time} steps), {self.num_jobs} to run."
\ No newline at end of file
+        s = f"{self.name}: Chunk (Size {self.chunk_size} ~ {self.chunk_time} steps), {self.num_jobs} to run."
+        if self.preemption.mode != Preemption.Mode.FREE:
+            s += f" {self.preemption}."
+        return s
\ No newline at end of file
@@ -1,93 +1,209 @@
 import logging
+import math
 
 from Schedulers.BaseScheduler import Scheduler
+from IndexedHeap import IndexedHeap
 from Job import Job
 
 
 class SRPT(Scheduler):
     """
     Shortest Remaining Processing Time (SRPT) Scheduler.
+    - Jobs are kept in an indexed heap ordered by (not is_priority, remaining tokens), ties by arrival on this device.
+      Only the keys of the jobs that changed (batch growth, swaps, promotions) are updated at each step.
+    - The run_queue keeps the arrival order, the heap gives the scheduling order.
+    - Starvation counts are lazy: a waiting job accumulates one count per scheduling round (self.round)
+      since its count was last written, and a second heap keyed by that starting round finds the starving jobs.
     """
-    def __init__(self, env, device, memory, batch, priority_quantum, starvation_threshold):
-        super().__init__(env, device, memory, batch,"SRPT")
+    def __init__(self, env, device, memory, batch, priority_quantum, starvation_threshold, preemption=None):
+        super().__init__(env, device, memory, batch,"SRPT", preemption)
         self.priority_quantum = priority_quantum
         self.starvation_threshold = starvation_threshold
         self.wait_queue = []
+        self.priority_queue = IndexedHeap()
+        # Lazy starvation counts
+        self.round = 0
+        self.selected_jobs: list[Job] = []  # Jobs selected in the last round
+        self._starving = IndexedHeap()  # Unselected jobs, keyed by round - starvation count
+        self._count_round: dict[Job, int] = {}  # Round up to which each job's starvation count is written
 
-    def _find_target_job(self):
-        """
-        Find the last job in the run queue that occupies memory.
-        :return: int - index of the job in the run queue
-        """
-        for i in range(len(self.run_queue)-1, 0, -1):
-            if self.run_queue[i].current_size > 0:
-                return i
-        return None
+    @staticmethod
+    def _key(job: Job) -> tuple:
+        return not job.is_priority, job.final_size - job.current_size
+
+    @property
+    def _starvation_enabled(self) -> bool:
+        return self.priority_quantum is not None and self.starvation_threshold is not None
 
     def add_job(self, job):
         # Check if we have enough memory to accept this new job
-        if job.init_size <= self.memory.safe_capacity - self._get_expected_memory():
-            self.run_queue.append(job)
-            return True
+        if job.init_size <= self.memory.safe_capacity - self.expected_tokens:
+            return self._enqueue(job)
         else:
             self.wait_queue.append(job)
             logging.debug(f"Job({job.job_id}) blocked due to memory shortage.")
             return True
 
+    def _enqueue(self, job: Job) -> bool:
+        super().add_job(job)
+        self.priority_queue.push(job, self._key(job))
+        if self._starvation_enabled:
+            self._count_round[job] = self.round
+            self._starving.push(job, self.round - job.starvation_count)
+        return True
+
+    def remove_job(self, job : Job):
+        """
+        Override the remove_job method to drop the job from the heaps, writing its starvation count.
+        """
+        super().remove_job(job)
+        self.priority_queue.remove(job)
+        if job in self._starving:
+            job.starvation_count = self.round - self._starving.key(job)
+            self._starving.remove(job)
+        self._count_round.pop(job, None)
+        if job in self.selected_jobs:
+            self.selected_jobs.remove(job)
+
+    def _advance_batch(self, batch, curr_time, steps=1):
+        """
+        Override the _advance_batch method to decrease the keys of the running jobs.
+        """
+        finished = super()._advance_batch(batch, curr_time, steps)
+        for job in batch:
+            self.priority_queue.update(job, self._key(job))
+            self._reorder_resident(job)
+        return finished
+
+    def _swap_in(self, job, size):
+        """
+        Override the _swap_in method to update the key of the job.
+        """
+        super()._swap_in(job, size)
+        self.priority_queue.update(job, self._key(job))
+        self._reorder_resident(job)
+
+    def _swap_out(self, job, mode=None):
+        """
+        Override the _swap_out method to update the key of the job.
+        """
+        super()._swap_out(job, mode)
+        self.priority_queue.update(job, self._key(job))
+
+    def _eviction_key(self, job):
+        """
+        Override the _eviction_key method: the job with the lowest priority goes first.
+        """
+        (not_priority, remaining), order = self.priority_queue.rank_key(job)
+        return -not_priority, -remaining, -order
+
     def pick_next_task(self) -> list[Job]:
         # Unblock waiting jobs if memory is available
-        while self._get_expected_memory() < self.memory.safe_capacity and self.wait_queue:
+        while self.expected_tokens < self.memory.safe_capacity and self.wait_queue:
             job = self.wait_queue.pop(0)
             logging.debug(f"Job({job.job_id}) unblocked thanks to memory availability.")
-            self.run_queue.append(job)
+            self._enqueue(job)
 
-        self.run_queue = sorted(self.run_queue, key=lambda job: (not job.is_priority, job.final_size - job.current_size))
+        self.round += 1
+        candidates = self.priority_queue.smallest(self.batch)
         selected_jobs = []
-        i = 0
-        while i < min(self.batch, len(self.run_queue)):
-            job = self.run_queue[i]
+        for job in candidates:
             if job.current_size == 0:
                 assert job.swap_size > 0 or job.init_size > 0
-                can_swap_in = True
-
-                # Swap out lowest priority request until we can swap in
-                while not self.memory.request(max(job.swap_size, job.init_size)):
-                    found = False
-                    for j in range(len(self.run_queue)-1, i, -1):
-                        if self.run_queue[j].current_size > 0:
-                            self.memory.release(self.run_queue[j].current_size)
-                            self.run_queue[j].swap_size = self.run_queue[j].current_size
-                            self.run_queue[j].current_size = 0
-                            found = True
-                            break
-                    if not found:
-                        can_swap_in = False
-                        break
-                if can_swap_in:
-                    job.current_size = max(job.swap_size, job.init_size)
-                    job.swap_size = 0
-                else:
+                size = max(job.swap_size, job.init_size)
+
+                # Swap out lowest priority requests until we can swap in
+                if not self._free_memory(size, after=job) or not self.memory.request(size, owner=job.job_id, prefix=job.prefix):
                     break
+                self._swap_in(job, size)
             selected_jobs.append(job)
-            i += 1
 
-        if self.priority_quantum is not None and self.starvation_threshold is not None:
-            for job in selected_jobs:
-                job.last_scheduled_time = self.env.now
-                if job.is_priority:
-                    job.quantum -= 1
-            for job in self.run_queue[i:]:  # Unselected jobs
-                job.starvation_count += 1
-            for job in self.run_queue:
-                if job.starvation_count >= self.starvation_threshold:
-                    job.is_priority = True
-                    job.starvation_count = 0
-                    job.quantum = self.priority_quantum
+        if self._starvation_enabled:
+            self._update_starvation(selected_jobs)
+        self.selected_jobs = selected_jobs
 
         return selected_jobs
-        
+
         # TODO: make this memory aware
         # TODO: let's try maxxing out batch size to compute-bound region.
         # Concern: right now it sems like we're blocking if it doesn't fit into GPU memory in RR
         # let's introduce a swapped requests var instead
-        # ALso round robin assumes chosen requests won't overflow memory - not always true.
\ No newline at end of file
+        # ALso round robin assumes chosen requests won't overflow memory - not always true.
+
+    def _update_starvation(self, selected_jobs: list[Job]) -> None:
+        """
+        Account one scheduling round: unselected jobs starve one more round, selected jobs do not,
+        and jobs reaching the starvation threshold are promoted to priority jobs.
+        Only the jobs entering or leaving the selection and the promoted jobs are touched.
+        """
+        # Jobs leaving the selection start starving from the previous round
+        for job in self.selected_jobs:
+            if job in self.priority_queue and job not in self._starving and job not in selected_jobs:
+                self._starving.push(job, self._count_round[job] - job.starvation_count)
+
+        for job in selected_jobs:
+            job.last_scheduled_time = self.env.now
+            if job.is_priority:
+                job.quantum -= 1
+            if job in self._starving:
+                job.starvation_count = self.round - 1 - self._starving.key(job)
+                self._starving.remove(job)
+            self._count_round[job] = self.round
+
+        # Starvation count of a waiting job is self.round - key
+        while self._starving and self.round - self._starving.peek_key() >= self.starvation_threshold:
+            job = self._starving.peek()
+            job.is_priority = True
+            job.starvation_count = 0
+            job.quantum = self.priority_quantum
+            self._count_round[job] = self.round
+            self._starving.update(job, self.round)
+            self.priority_queue.update(job, self._key(job))
+            self._reorder_resident(job)
+
+    def pick_movable_job(self, expected_stages: list[Job.State]) -> Job|None:
+        """
+        Override the pick_movable_job method to follow the scheduling order instead of the arrival order:
+        the first job after the next batch, preferring jobs that are not yet running.
+        """
+        next_batch = set(self.priority_queue.smallest(self.batch))
+        waiting_job, waiting_key = None, None
+        running_job, running_key = None, None
+        for job in self.priority_queue:
+            if job.state not in expected_stages or job in next_batch:
+                continue
+            key = self.priority_queue.rank_key(job)
+            if job.current_size == 0:
+                if waiting_job is None or key < waiting_key:
+                    waiting_job, waiting_key = job, key
+            elif running_job is None or key < running_key:
+                running_job, running_key = job, key
+        return waiting_job if waiting_job is not None else running_job
+
+    def steps_until_event(self):
+        if not self.run_queue:
+            return math.inf
+        # Waiting jobs will be unblocked in the next step
+        if self.wait_queue and self.expected_tokens < self.memory.safe_capacity:
+            return 0
+        # The next batch must be the current one, running jobs only get shorter and stay in front
+        batch = self.priority_queue.smallest(self.batch)
+        if batch != self.selected_jobs:
+            return 0
+        steps = self._stable_steps(batch)
+        # The step that promotes a starving job reorders the queue
+        if self._starvation_enabled and self._starving:
+            max_starvation = self.round - self._starving.peek_key()
+            steps = min(steps, max(self.starvation_threshold - max_starvation - 1, 0))
+        return steps
+
+    def fast_forward(self, steps):
+        selected_jobs = self.selected_jobs
+        self._fast_forward_batch(selected_jobs, steps)
+        self.round += steps
+        if self._starvation_enabled:
+            for job in selected_jobs:
+                job.last_scheduled_time = self.env.now + steps
+                if job.is_priority:
+                    job.quantum -= steps
+                self._count_round[job] = self.round
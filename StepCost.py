@@ -0,0 +1,111 @@
+import json
+from dataclasses import dataclass
+
+
+@dataclass
+class StepWork:
+    """
+    Work done by a device in one step, as seen by its step cost model.
+    """
+    batch_size: int = 0        # Decoding jobs, producing one token each
+    context_tokens: int = 0    # Tokens held by the decoding jobs, read by the attention
+    prefill_tokens: float = 0  # Prompt tokens computed in the step
+
+    def __add__(self, other: "StepWork") -> "StepWork":
+        return StepWork(self.batch_size + other.batch_size,
+                        self.context_tokens + other.context_tokens,
+                        self.prefill_tokens + other.prefill_tokens)
+
+    @property
+    def is_empty(self) -> bool:
+        return self.batch_size == 0 and self.prefill_tokens == 0
+
+
+class StepCost:
+    """
+    Duration of a device step, in simulation time units.
+    By default, every step takes exactly one time unit whatever it runs.
+    """
+
+    @property
+    def is_unit(self) -> bool:
+        """
+        Whether every step takes exactly one time unit, so that quiet steps can be fast-forwarded.
+        """
+        return True
+
+    def cost(self, work: StepWork) -> float:
+        """
+        :return: The duration of a step doing `work`.
+        """
+        return 1
+
+    def __str__(self):
+        return "Unit step cost"
+
+
+class RooflineCost(StepCost):
+    """
+    Roofline-style step duration: a step is bound either by its compute or by its memory traffic.
+    - compute = compute_per_token * (batch size + prefill tokens)
+    - memory  = weight_load + kv_per_token * context tokens, the weights are read once per step
+    - duration = overhead + max(compute, memory), and 0 for a step without work.
+    Small decode batches are memory bound (the weights dominate), so batching is almost free until
+    the batch turns compute bound, while long contexts slow every step down.
+
+    Coefficients are in time units (e.g., milliseconds when a simulation step is one millisecond).
+    The simulation step is the time resolution: a device starts at most one step per simulation step.
+    """
+
+    def __init__(self, overhead: float = 0.0, compute_per_token: float = 0.0, weight_load: float = 1.0,
+                 kv_per_token: float = 0.0):
+        """
+        :param overhead: Fixed cost of a step (e.g., scheduling and kernel launches).
+        :param compute_per_token: Compute time of one token, decoded or prefilled.
+        :param weight_load: Time to read the model weights once.
+        :param kv_per_token: Time to read the cached keys and values of one context token.
+        """
+        if min(overhead, compute_per_token, weight_load, kv_per_token) < 0:
+            raise ValueError("Step cost coefficients must not be negative.")
+        self.overhead = overhead
+        self.compute_per_token = compute_per_token
+        self.weight_load = weight_load
+        self.kv_per_token = kv_per_token
+
+    @staticmethod
+    def from_profile(path: str, device_name: str) -> "RooflineCost":
+        """
+        Load the coefficients of a device from a JSON profile file, e.g.:
+            {"default": {"overhead": 2, "weight_load": 20, "compute_per_token": 0.05, "kv_per_token": 0.001},
+             "Decode_1": {"weight_load": 12}}
+        The entry named after the device overrides the "default" entry.
+        """
+        with open(path) as f:
+            profile = json.load(f)
+        if device_name not in profile and "default" not in profile:
+            raise ValueError(f"No step cost profile for {device_name} in {path}.")
+        coefficients = {**profile.get("default", {}), **profile.get(device_name, {})}
+        return RooflineCost(**coefficients)
+
+    @property
+    def is_unit(self) -> bool:
+        """
+        Override the is_unit property: the duration depends on the work of the step.
+        """
+        return False
+
+    def cost(self, work: StepWork) -> float:
+        """
+        Override the cost method with the roofline model.
+        """
+        if work.is_empty:
+            return 0.0
+        compute = self.compute_per_token * (work.batch_size + work.prefill_tokens)
+        memory = self.weight_load + self.kv_per_token * work.context_tokens
+        return self.overhead + max(compute, memory)
+
+    def __str__(self):
+        return (
+            f"Roofline step cost (Overhead {self.overhead}, Compute {self.compute_per_token}/token, "
+            f"Weights {self.weight_load}, KV {self.kv_per_token}/token)"
+        )
@@ -1,3 +1,5 @@
+import math
+import pickle
 import logging
 from dataclasses import dataclass
 
@@ -40,6 +42,17 @@ class SysReport:
     max_ttft: float = 0.0
     p95_ttft: float = 0.0
     p99_ttft: float = 0.0
+    # Prefix cache metrics, summed over the device memories
+    prefix_lookups: int = 0
+    prefix_hits: int = 0
+    prefix_hit_rate: float = 0.0
+    prefix_hit_tokens: int = 0
+    prefix_evictions: int = 0
+    # Memory tier usage, as fractions of the capacity: averages over all devices, peaks of the busiest device
+    average_memory_usage: float = 0.0
+    peak_memory_usage: float = 0.0
+    average_host_usage: float = 0.0
+    peak_host_usage: float = 0.0
 
     def __str__(self):
         return f"""
@@ -63,6 +76,16 @@ class SysReport:
         Max TTFT: {self.max_ttft:.2f}
         95th Percentile TTFT: {self.p95_ttft:.2f}
         99th Percentile TTFT: {self.p99_ttft:.2f}
+        -------------------- Prefix Cache --------------------
+        Prefix Lookups: {self.prefix_lookups}
+        Prefix Hit Rate: {self.prefix_hit_rate:.4f} ({self.prefix_hits} hits)
+        Prefix Tokens Reused: {self.prefix_hit_tokens}
+        Prefix Evictions: {self.prefix_evictions}
+        -------------------- Memory Tiers --------------------
+        Average Device Memory Usage: {self.average_memory_usage:.4f}
+        Peak Device Memory Usage: {self.peak_memory_usage:.4f}
+        Average Host Memory Usage: {self.average_host_usage:.4f}
+        Peak Host Memory Usage: {self.peak_host_usage:.4f}
         -------------------- End of Report --------------------
         """
 
@@ -70,6 +93,9 @@ class System:
     """
     The main wrapper class for the system.
     """
+    # In event-driven mode, a check that finds no quiet step is not repeated for the next 1, 2, 4, ... steps,
+    # up to MAX_CHECK_BACKOFF, so that a cluster that is never quiet does not pay for it at every step.
+    MAX_CHECK_BACKOFF = 16
 
     def __init__(self, env, tasks_generator: Generator, global_scheduler: GlobalScheduler, devices_allocator: Allocator):
         self.env = env
@@ -82,7 +108,15 @@ class System:
         self.completed_jobs: list[Job] = []
 
 
-    def run_simulation(self, max_time=1000):
+    def run_simulation(self, max_time=1000, event_driven=False):
+        """
+        Run the simulation until all jobs are finished or `max_time` is reached.
+        :param max_time: Upper bound of the simulation time.
+        :param event_driven: Jump over quiet steps (no arrival, no dispatch, no device or allocator change)
+                             instead of simulating them one by one. Produces the same report as the tick engine.
+        """
+        backoff = 0
+        skipped_checks = 0
         while self.env.now < max_time:
             # 0. Print current time
             logging.debug(f"---------- Time: {self.env.now} ----------")
@@ -119,20 +153,110 @@ class System:
                 logging.info("All devices and generator are finished.")
                 break
 
-            # 6. Advance simulation time by 1 “second”
-            yield self.env.timeout(1)
+            # 6. Advance simulation time by 1 “second”, jumping over the quiet steps in event-driven mode
+            steps = 1
+            if event_driven:
+                if skipped_checks < backoff:
+                    # Simulating a step one by one is always exact, only the lookup is skipped
+                    skipped_checks += 1
+                else:
+                    skipped_checks = 0
+                    quiet_steps = min(self._steps_until_event(), max_time - self.env.now - 1)
+                    if quiet_steps > 0:
+                        logging.debug(f"Fast-forwarding {quiet_steps} quiet steps...")
+                        self._fast_forward(quiet_steps)
+                        steps += quiet_steps
+                        backoff = 0
+                    else:
+                        backoff = min(2 * backoff or 1, System.MAX_CHECK_BACKOFF)
+            yield self.env.timeout(steps)
 
         # End while
         logging.info(f"Simulation ended at time {self.env.now}")
         self.completed_jobs = self.global_scheduler.finished_jobs
 
 
+    def _steps_until_event(self) -> int|float:
+        """
+        Number of upcoming steps that are guaranteed to be quiet for every component.
+        The global scheduler is polled first: on a busy cluster, it has jobs to dispatch or to balance at almost every step.
+        """
+        steps = math.inf
+        for component in [self.global_scheduler, self.generator, self.allocator, *self.allocator.online_devices]:
+            steps = min(steps, component.steps_until_event())
+            if steps == 0:
+                break
+        return steps
+
+    def _fast_forward(self, steps: int) -> None:
+        """
+        Apply `steps` quiet steps to every component at once.
+        """
+        self.generator.fast_forward(steps)
+        for device in self.allocator.online_devices:
+            device.fast_forward(steps)
+        self.allocator.fast_forward(steps)
+
+    def snapshot(self, path: str|None = None) -> bytes:
+        """
+        Capture the full simulation state: clock, generator cursors, global queue, device schedulers,
+        memories, allocator counters, and the random streams owned by the generator.
+
+        Take it between two runs, e.g., after `run_simulation(max_time=T)` returned, then resume the
+        restored system with a new `run_simulation` process, as if the simulation was never interrupted.
+        The clock must be picklable with no pending process (StepClock), as must be the generator
+        (e.g., no lambdas in RandomGenerator).
+        :param path: Optionally also write the snapshot to this file.
+        :return: The serialized snapshot.
+        """
+        blob = pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+        if path is not None:
+            with open(path, "wb") as f:
+                f.write(blob)
+        return blob
+
+    @staticmethod
+    def restore(snapshot: bytes|str) -> "System":
+        """
+        Rebuild a system from a snapshot (or a snapshot file), e.g., in another process.
+        The random streams are restored with the generator, so every system restored from the same
+        snapshot replays the same random decisions.
+        """
+        if isinstance(snapshot, str):
+            with open(snapshot, "rb") as f:
+                snapshot = f.read()
+        return pickle.loads(snapshot)
+
+    def fork(self) -> "System":
+        """
+        Create an independent copy of the current simulation state in this process.
+        """
+        return System.restore(self.snapshot())
+
     def report_stats(self) -> SysReport:
         sysreport = SysReport()
 
         sysreport.total_time = self.env.now
         sysreport.finished_jobs = len(self.completed_jobs)
 
+        for device in self.allocator.all_devices:
+            memory = device.memory
+            sysreport.prefix_lookups += memory.prefix_lookups
+            sysreport.prefix_hits += memory.prefix_hits
+            sysreport.prefix_hit_tokens += memory.prefix_hit_tokens
+            sysreport.prefix_evictions += memory.prefix_evictions
+        if sysreport.prefix_lookups > 0:
+            sysreport.prefix_hit_rate = sysreport.prefix_hits / sysreport.prefix_lookups
+
+        memories = [device.memory for device in self.allocator.all_devices]
+        hosts = [device.host_memory for device in self.allocator.all_devices if device.host_memory is not None]
+        for tier, average_field, peak_field in ((memories, "average_memory_usage", "peak_memory_usage"),
+                                                (hosts, "average_host_usage", "peak_host_usage")):
+            if tier:
+                capacity = sum(memory.capacity for memory in tier)
+                setattr(sysreport, average_field, sum(memory.average_usage for memory in tier) / capacity)
+                setattr(sysreport, peak_field, max(memory.peak_usage / memory.capacity for memory in tier))
+
         if len(self.completed_jobs) == 0:
             return sysreport
 
@@ -181,9 +305,10 @@ class System:
 
         """
         Normalized Turnaround Time = [turnaround_time / sequence_length]
+        A job without any output to generate counts as one output token.
         """
         normalized_turnaround_times = [
-            tt / (job.final_size - job.init_size) for tt, job in zip(turnaround_times, self.completed_jobs)
+            tt / max(job.final_size - job.init_size, 1) for tt, job in zip(turnaround_times, self.completed_jobs)
         ]
         
         sysreport.normalized_turnaround_times = normalized_turnaround_times
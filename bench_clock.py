@@ -0,0 +1,78 @@
+import contextlib
+import io
+import logging
+import subprocess
+import sys
+import time
+
+from Clock import StepClock, SimPyClock
+import md_main
+
+
+def time_import(module: str) -> float:
+    """
+    Measure the import time of a module in a fresh interpreter, in seconds.
+    """
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return float(output)
+
+
+def time_clock_loop(clock_cls, steps: int) -> float:
+    """
+    Measure the pure clock overhead of a process advancing `steps` times by 1, in seconds.
+    """
+    def process(env):
+        for _ in range(steps):
+            yield env.timeout(1)
+
+    env = clock_cls()
+    env.process(process(env))
+    start = time.perf_counter()
+    env.run()
+    return time.perf_counter() - start
+
+
+def time_main(clock_cls, repeat: int) -> tuple[float, int]:
+    """
+    Run md_main.main() on the given clock and keep the best wall-clock time.
+    :return: (best time in seconds, number of simulated steps)
+    """
+    best = float("inf")
+    steps = 0
+    for _ in range(repeat):
+        env = clock_cls()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = md_main.main(env=env, seed=0)
+        best = min(best, time.perf_counter() - start)
+        steps = report.total_time
+    return best, steps
+
+
+def bench_clock(repeat=5):
+    """
+    Compare the per-step overhead of the SimPy adapter against the default StepClock on md_main.main().
+    """
+    print(f"Import simpy: {time_import('simpy') * 1e3:.2f} ms")
+    for clock_cls in (SimPyClock, StepClock):
+        loop_time = time_clock_loop(clock_cls, 100000)
+        print(f"{clock_cls.__name__:<12} empty loop: {loop_time / 100000 * 1e6:.3f} us/step")
+
+    results = {}
+    for clock_cls in (SimPyClock, StepClock):
+        best, steps = time_main(clock_cls, repeat)
+        results[clock_cls.__name__] = (best, steps)
+        print(f"{clock_cls.__name__:<12} {best:.4f} s for {steps} steps ({best / steps * 1e6:.2f} us/step)")
+
+    simpy_time, simpy_steps = results[SimPyClock.__name__]
+    step_time, step_steps = results[StepClock.__name__]
+    saved = simpy_time / simpy_steps - step_time / step_steps
+    print(f"Per-step overhead saved: {saved * 1e6:.2f} us/step ({(1 - step_time / simpy_time) * 100:.1f}% of the run)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARN, format='%(levelname)s : %(message)s')
+    logging.disable(logging.CRITICAL)
+
+    bench_clock()
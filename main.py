@@ -1,21 +1,23 @@
-import simpy
-import random
 import logging
+from Allocator import Allocator
+from Clock import StepClock
+from Device import Device
 from System import System, SysReport
-from Memory import Memory
 from Generators.Random import RandomGenerator
 from Generators.Loader import CSVSource, CSVGenerator
+from Schedulers.GlobalScheduler import GlobalScheduler
 from Schedulers.FCFS import FCFS
+from Schedulers.FCFS_prefill import FCFSPre
 from Schedulers.RR import RR
 from Schedulers.SRPT import SRPT
 
 import numpy as np
 
 
-def zipf(s, min_tokens, max_tokens):
+def zipf(s, min_tokens, max_tokens, rng: np.random.Generator):
     """
     Generate a request length between min_tokens and max_tokens using a truncated
-    Zipf distribution with exponent s.
+    Zipf distribution with exponent s, drawing from the given random stream.
     
     Approximately 95% of the probability mass will produce lengths below 4096 tokens.
     """
@@ -30,63 +32,79 @@ def zipf(s, min_tokens, max_tokens):
     cdf /= cdf[-1]  # normalize to 1
     
     # Draw a random number and use inverse transform sampling.
-    u = np.random.rand()
+    u = rng.random()
     idx = np.searchsorted(cdf, u)
     return int(ks[idx])
 
 
 
-def main(sched_class="FCFS", rr_time_slice=10, batch_size=4, **kwargs) -> SysReport:
-    # 1. Create SimPy Environment
-    env = simpy.Environment()
-
-    # 2. Define Memory Resource
-    memory = Memory(env, capacity=300000, threshold=0.90)
+def main(sched_class="FCFS", rr_time_slice=10, batch_size=4, event_driven=False, seed=0, **kwargs) -> SysReport:
+    """
+    Single decode device experiment: one prefill device feeds the decode device running the scheduler under test.
+    Runs with the same seed see the same jobs, so that the schedulers are compared on common random numbers.
+    """
+    # 1. Create the simulation clock
+    env = StepClock()
 
-    # 3. Define Scheduler
+    # 2. Define the Scheduler under test
     if sched_class == "FCFS":
-        scheduler = FCFS(env, memory=memory, batch=batch_size)
+        scheduler_cls, scheduler_kwargs = FCFS, {'batch': batch_size}
     elif sched_class == "RR":
-        scheduler = RR(env, memory=memory, batch=batch_size, time_slice=rr_time_slice)
+        scheduler_cls, scheduler_kwargs = RR, {'batch': batch_size, 'time_slice': rr_time_slice}
     elif sched_class == "SRPT":
-        scheduler = SRPT(env, memory=memory, batch=batch_size, **kwargs)
+        scheduler_cls, scheduler_kwargs = SRPT, {'batch': batch_size, **kwargs}
     else:
         raise ValueError("Unknown scheduler type")
 
+    # 3. Define Devices, Global Scheduler and Allocator
+    dev_p = Device(env,
+                   name="Prefill", tag=Device.Mode.PREFILL,
+                   memory_capacity=300000, memory_kwargs={'threshold': 0.90},
+                   scheduler_cls=FCFSPre, scheduler_kwargs={'chunk_size': 512, 'chunk_time': 5})
+    dev_d = Device(env,
+                   name="Decode", tag=Device.Mode.DECODE,
+                   memory_capacity=300000, memory_kwargs={'threshold': 0.90},
+                   scheduler_cls=scheduler_cls, scheduler_kwargs=scheduler_kwargs)
+    dev_list = [dev_p, dev_d]
+    global_sched = GlobalScheduler(devices=dev_list)
+    allocator = Allocator(global_scheduler=global_sched, all_devices=dev_list, idle_threshold=-1)
+
     # 4. Define Generator
     # generator = RandomGenerator(
     #     env,
-    #     scheduler=scheduler,
+    #     scheduler=global_sched,
     #     speed=0.02,  # NOTE: this is double the achievable throughput
     #     total=1000,
     #     dropout=0.05,
-    #     init_fn=lambda: random.randint(1024, 2048),
-    #     output_fn=lambda: zipf(s=1.98, min_tokens=256, max_tokens=16384)
+    #     init_fn=lambda rng: int(rng.integers(1024, 2048, endpoint=True)),
+    #     output_fn=lambda rng: zipf(s=1.98, min_tokens=256, max_tokens=16384, rng=rng),
+    #     seed=seed
     # )
     generator = CSVGenerator(
         env,
-        scheduler=scheduler,
+        scheduler=global_sched,
         speed=0.02,  # NOTE: this is double the achievable throughput
         total=1000,
         dropout=0.05,
         csv_sources=[
             CSVSource(nickname="AzChat23", file_path="Generators/data/AzureLLMInferenceTrace_conv.csv", fraction=0.5),
             CSVSource(nickname="AzCode23", file_path="Generators/data/AzureLLMInferenceTrace_code.csv", fraction=0.5),
-        ]
+        ],
+        seed=seed
     )
 
     # 5. Create the System
-    system = System(env, memory=memory, scheduler=scheduler, generator=generator)
+    system = System(env, tasks_generator=generator, global_scheduler=global_sched, devices_allocator=allocator)
 
     # 6. Run the simulation
-    env.process(system.run_simulation(max_time=1000000))
+    env.process(system.run_simulation(max_time=1000000, event_driven=event_driven))
     env.run()
 
     # 7. Print results
     print(system)
     return system.report_stats()
 
-# This is deprecated after v2.1.0, use the multi-device version in md_main.py
+# Used by the experiment runner, use the multi-device version in md_main.py for other setups
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG, format='%(message)s')
 
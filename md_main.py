@@ -1,7 +1,7 @@
-import simpy
 import logging
 
 from Allocator import Allocator
+from Clock import Clock, StepClock
 from System import System, SysReport
 from Device import Device
 from Schedulers.GlobalScheduler import GlobalScheduler
@@ -12,9 +12,10 @@ from Schedulers.FCFS_prefill import FCFSPre
 from Schedulers.Hybrid_FR import HybridFR
 
 
-def main() -> SysReport:
-    # 1. Create SimPy Environment
-    env = simpy.Environment()
+def main(event_driven=False, env: Clock|None = None, seed: int|None = 0) -> SysReport:
+    # 1. Create the simulation clock (pass a SimPyClock to run on SimPy)
+    if env is None:
+        env = StepClock()
 
     # 2. Define Device(s)
     # Our Standard Prefill device
@@ -53,14 +54,15 @@ def main() -> SysReport:
         csv_sources=[
             CSVSource(nickname="AzChat23", file_path="Generators/data/AzureLLMInferenceTrace_conv.csv", fraction=0.5),
             CSVSource(nickname="AzCode23", file_path="Generators/data/AzureLLMInferenceTrace_code.csv", fraction=0.5),
-        ]
+        ],
+        seed=seed  # None for a different job sequence on every run
     )
 
     # 5. Create the System
     system = System(env, tasks_generator=generator, global_scheduler=global_sched, devices_allocator=allocator)
 
     # 6. Run the simulation
-    env.process(system.run_simulation(max_time=1000000))
+    env.process(system.run_simulation(max_time=1000000, event_driven=event_driven))
     env.run()
 
     # 7. Print results
@@ -1,9 +1,18 @@
+import contextlib
+import inspect
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import matplotlib.pyplot as plt
 import numpy as np
-import logging
 
 from main import main
 from System import SysReport
+from Generators.Loader import load_trace
+from ResultCache import ResultCache
 
 def plot_results(stats_list : list[SysReport], label_list : list[str], save_path="simulation_results.png"):
     """
@@ -113,98 +122,116 @@ def generate_markdown_table(stats_list : list[SysReport], label_list : list[str]
     print("| 99th Percentile Slowdown | " + " | ".join([f"{sd:.6f}" for sd in p99_slowdowns]) + " |")
 
 
-def runner_main(batch_size=8):
-    stats_list : list[SysReport] = []
-    label_list : list[str] = []
-
-    # Simulation 1: SRPT
-    print("Running SRPT (no starvation prevention) simulation...")
-    stats_srpt = main(sched_class="SRPT", batch_size=batch_size, priority_quantum=None, starvation_threshold=None)
-    stats_list.append(stats_srpt)
-    label_list.append("SRPT")
-    print(stats_srpt)
-
-    print("Running SRPT (PQ 1, ST 50) simulation...")
-    stats_srpt = main(sched_class="SRPT", batch_size=batch_size, priority_quantum=1, starvation_threshold=50)
-    stats_list.append(stats_srpt)
-    label_list.append("SRPT-1-50")
-    print(stats_srpt)
-
-    print("Running SRPT (PQ 5, ST 50) simulation...")
-    stats_srpt = main(sched_class="SRPT", batch_size=batch_size, priority_quantum=5, starvation_threshold=50)
-    stats_list.append(stats_srpt)
-    label_list.append("SRPT-5-50")
-    print(stats_srpt)
-    
-    print("Running SRPT (PQ 25, ST 50) simulation...")
-    stats_srpt = main(sched_class="SRPT", batch_size=batch_size, priority_quantum=10, starvation_threshold=50)
-    stats_list.append(stats_srpt)
-    label_list.append("SRPT-25-50")
-    print(stats_srpt)
-
-    print("Running SRPT (PQ 1, ST 100) simulation...")
-    stats_srpt = main(sched_class="SRPT", batch_size=batch_size, priority_quantum=1, starvation_threshold=100)
-    stats_list.append(stats_srpt)
-    label_list.append("SRPT-1-100")
-    print(stats_srpt)
-
-    print("Running SRPT (PQ 10, ST 100) simulation...")
-    stats_srpt = main(sched_class="SRPT", batch_size=batch_size, priority_quantum=10, starvation_threshold=100)
-    stats_list.append(stats_srpt)
-    label_list.append("SRPT-10-100")
-    print(stats_srpt)
-
-    print("Running SRPT (PQ 50, ST 100) simulation...")
-    stats_srpt = main(sched_class="SRPT", batch_size=batch_size, priority_quantum=50, starvation_threshold=100)
-    stats_list.append(stats_srpt)
-    label_list.append("SRPT-50-100")
-    print(stats_srpt)
-
-    print("Running SRPT (PQ 1, ST 1000) simulation...")
-    stats_srpt = main(sched_class="SRPT", batch_size=batch_size, priority_quantum=1, starvation_threshold=1000)
-    stats_list.append(stats_srpt)
-    label_list.append("SRPT-1-1000")
-    print(stats_srpt)
-
-    print("Running SRPT (PQ 100, ST 1000) simulation...")
-    stats_srpt = main(sched_class="SRPT", batch_size=batch_size, priority_quantum=100, starvation_threshold=1000)
-    stats_list.append(stats_srpt)
-    label_list.append("SRPT-100-1000")
-    print(stats_srpt)
-
-    print("Running SRPT (PQ 500, ST 1000) simulation...")
-    stats_srpt = main(sched_class="SRPT", batch_size=batch_size, priority_quantum=500, starvation_threshold=1000)
-    stats_list.append(stats_srpt)
-    label_list.append("SRPT-500-1000")
-    print(stats_srpt)
-
-    # Simulation 2: RR-1
-    print("Running RR-1 simulation...")
-    stats_rr1 = main(sched_class="RR", rr_time_slice=1, batch_size=batch_size)
-    stats_list.append(stats_rr1)
-    label_list.append("RR-1")
-    print(stats_rr1)
-
-    # Simulation 3: RR-10
-    print("Running RR-10 simulation...")
-    stats_rr10 = main(sched_class="RR", rr_time_slice=10, batch_size=batch_size)
-    stats_list.append(stats_rr10)
-    label_list.append("RR-10")
-    print(stats_rr10)
-
-    # Simulation 4: RR-100
-    print("Running RR-100 simulation...")
-    stats_rr100 = main(sched_class="RR", rr_time_slice=100, batch_size=batch_size)
-    stats_list.append(stats_rr100)
-    label_list.append("RR-100")
-    print(stats_rr100)
-
-    # Simulation 5: FCFS
-    print("Running FCFS simulation...")
-    stats_fcfs = main(sched_class="FCFS", batch_size=batch_size)
-    stats_list.append(stats_fcfs)
-    label_list.append("FCFS")
-    print(stats_fcfs)
+# Traces used by main(), loaded once in the runner process before the workers start.
+TRACE_FILES = [
+    "Generators/data/AzureLLMInferenceTrace_conv.csv",
+    "Generators/data/AzureLLMInferenceTrace_code.csv",
+]
+
+
+def _run_config(kwargs: dict) -> SysReport:
+    """
+    Run one configuration in a worker process.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return main(**kwargs)
+
+
+def _full_config(kwargs: dict) -> dict:
+    """
+    Return every parameter of main() for the given kwargs, defaults included.
+    """
+    bound = inspect.signature(main).bind(**kwargs)
+    bound.apply_defaults()
+    return dict(bound.arguments)
+
+
+def run_sweep(configs: list[tuple[str, dict]], max_workers=None, cache: ResultCache|None = None) -> list[SysReport]:
+    """
+    Run every configuration in parallel on a process pool.
+
+    Parameters:
+        configs: list of (label, kwargs of main()) tuples
+
+        max_workers: int
+            Number of worker processes, defaults to the number of cores.
+
+        cache: ResultCache
+            Optional cache of results, only the configurations missing from it are simulated.
+
+    Returns the SysReports in the order of `configs`.
+    """
+    stats_list: list[SysReport|None] = [None] * len(configs)
+    keys: list[str|None] = [None] * len(configs)
+    if cache is not None:
+        for i, (label, kwargs) in enumerate(configs):
+            keys[i] = cache.key(_full_config(kwargs), TRACE_FILES)
+            stats_list[i] = cache.get(keys[i])
+            if stats_list[i] is not None:
+                logging.info(f"Cache hit for {label}")
+    pending = [i for i, stats in enumerate(stats_list) if stats is None]
+    if not pending:
+        return stats_list
+
+    # Load the traces once, forked workers share them copy-on-write (spawned workers load them once each)
+    for file_path in TRACE_FILES:
+        load_trace(file_path)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(pending)))
+    mp_context = None
+    if "fork" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("fork")
+
+    logging.info(f"Running {len(pending)} configurations on {max_workers} workers...")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+        # map() yields the results in submission order
+        results = executor.map(_run_config, [configs[i][1] for i in pending])
+        for i, stats in zip(pending, results):
+            stats_list[i] = stats
+            if cache is not None:
+                cache.put(keys[i], stats)
+    return stats_list
+
+
+def runner_main(batch_size=8, max_workers=None, use_cache=True, seed=0):
+    configs = [
+        # Simulation 1: SRPT
+        ("SRPT", dict(sched_class="SRPT", batch_size=batch_size, priority_quantum=None, starvation_threshold=None)),
+        ("SRPT-1-50", dict(sched_class="SRPT", batch_size=batch_size, priority_quantum=1, starvation_threshold=50)),
+        ("SRPT-5-50", dict(sched_class="SRPT", batch_size=batch_size, priority_quantum=5, starvation_threshold=50)),
+        ("SRPT-25-50", dict(sched_class="SRPT", batch_size=batch_size, priority_quantum=10, starvation_threshold=50)),
+        ("SRPT-1-100", dict(sched_class="SRPT", batch_size=batch_size, priority_quantum=1, starvation_threshold=100)),
+        ("SRPT-10-100", dict(sched_class="SRPT", batch_size=batch_size, priority_quantum=10, starvation_threshold=100)),
+        ("SRPT-50-100", dict(sched_class="SRPT", batch_size=batch_size, priority_quantum=50, starvation_threshold=100)),
+        ("SRPT-1-1000", dict(sched_class="SRPT", batch_size=batch_size, priority_quantum=1, starvation_threshold=1000)),
+        ("SRPT-100-1000", dict(sched_class="SRPT", batch_size=batch_size, priority_quantum=100, starvation_threshold=1000)),
+        ("SRPT-500-1000", dict(sched_class="SRPT", batch_size=batch_size, priority_quantum=500, starvation_threshold=1000)),
+        # Simulation 2: RR-1
+        ("RR-1", dict(sched_class="RR", rr_time_slice=1, batch_size=batch_size)),
+        # Simulation 3: RR-10
+        ("RR-10", dict(sched_class="RR", rr_time_slice=10, batch_size=batch_size)),
+        # Simulation 4: RR-100
+        ("RR-100", dict(sched_class="RR", rr_time_slice=100, batch_size=batch_size)),
+        # Simulation 5: FCFS
+        ("FCFS", dict(sched_class="FCFS", batch_size=batch_size)),
+    ]
+    # The event-driven engine produces the same reports, only faster.
+    # All variants share the seed, so they are compared on exactly the same jobs (common random numbers).
+    for _, kwargs in configs:
+        kwargs["event_driven"] = True
+        kwargs["seed"] = seed
+
+    label_list : list[str] = [label for label, _ in configs]
+    cache = ResultCache() if use_cache else None
+    stats_list : list[SysReport] = run_sweep(configs, max_workers=max_workers, cache=cache)
+    if cache is not None:
+        print(cache)
+
+    for label, stats in zip(label_list, stats_list):
+        print(f"{label} simulation:")
+        print(stats)
 
     generate_markdown_table(stats_list, label_list)
 
@@ -0,0 +1,162 @@
+import pytest
+
+from Clock import StepClock
+from Device import Device
+from Dispatch import BestFit, DispatchPolicy, JoinShortestQueue, MostHeadroom, PowerOfChoices, RoundRobin
+from Job import Job
+from Schedulers.FCFS_prefill import FCFSPre
+from Schedulers.GlobalScheduler import GlobalScheduler
+
+
+def prefill_device(env, name, capacity=1000):
+    return Device(env, name=name, tag=Device.Mode.PREFILL, memory_capacity=capacity, memory_kwargs={},
+                  scheduler_cls=FCFSPre, scheduler_kwargs={'chunk_size': 100, 'chunk_time': 2})
+
+
+def cluster(dispatch, capacities=(1000, 1000, 1000)):
+    env = StepClock()
+    devices = [prefill_device(env, f"P{i}", capacity) for i, capacity in enumerate(capacities)]
+    return GlobalScheduler(devices=list(devices), dispatch=dispatch), devices
+
+
+def jobs(*sizes, first_id=0):
+    return [Job(first_id + i, arrival_time=0, init_size=size, expected_output=10) for i, size in enumerate(sizes)]
+
+
+def queue_jobs(device, count, size=10):
+    for job in jobs(*[size] * count, first_id=100 * (device.scheduler.num_jobs + 1)):
+        assert device.add_job(job)
+
+
+def placements(scheduler, queued):
+    """
+    The device every job went to, the jobs left queued.
+    """
+    left = scheduler.dispatch.dispatch(scheduler, queued)
+    where = {}
+    for device in scheduler.devices:
+        for job in device.scheduler.run_queue:
+            where[job.job_id] = device.name
+    return where, left
+
+
+def test_least_loaded_breaks_ties_by_rank():
+    scheduler, (p0, p1, p2) = cluster(DispatchPolicy())
+    queue_jobs(p0, 1)
+    candidates = list(scheduler.dispatch.candidates(scheduler, jobs(1)[0]))
+    assert candidates == [p1, p2, p0]
+
+
+def test_join_shortest_queue_orders_by_queue_length_then_rank():
+    scheduler, (p0, p1, p2) = cluster(JoinShortestQueue())
+    queue_jobs(p0, 2)
+    queue_jobs(p1, 1)
+    queue_jobs(p2, 1)
+    assert list(scheduler.dispatch.candidates(scheduler, jobs(1)[0])) == [p1, p2, p0]
+    where, left = placements(scheduler, jobs(1, 1))
+    assert left == []
+    assert (where[0], where[1]) == ("P1", "P2")
+    # Every decision looks at all the devices
+    assert scheduler.dispatch.probes == 3 * 3
+
+
+def test_power_of_choices_samples_distinct_devices():
+    scheduler, devices = cluster(PowerOfChoices(choices=2, seed=3), capacities=[1000] * 6)
+    for job in jobs(*[1] * 20):
+        sampled = list(scheduler.dispatch.candidates(scheduler, job))[:2]
+        assert len(set(sampled)) == 2
+    assert scheduler.dispatch.probes == 40
+
+
+def test_power_of_choices_is_deterministic_per_seed():
+    def picks(seed):
+        scheduler, _ = cluster(PowerOfChoices(choices=2, seed=seed), capacities=[1000] * 8)
+        where, _ = placements(scheduler, jobs(*[1] * 10))
+        return [where[i] for i in range(10)]
+
+    assert picks(7) == picks(7)
+    assert picks(7) != picks(8)
+
+
+def test_power_of_choices_joins_the_shortest_sampled_queue():
+    # Sampling every device leaves the choice to the queue lengths, ties to the first added
+    scheduler, (p0, p1, p2) = cluster(PowerOfChoices(choices=3))
+    queue_jobs(p0, 1)
+    assert list(scheduler.dispatch.candidates(scheduler, jobs(1)[0])) == [p1, p2, p0]
+
+
+def test_power_of_choices_falls_back_to_the_least_loaded():
+    scheduler, devices = cluster(PowerOfChoices(choices=1, seed=5))
+    first = next(scheduler.dispatch.candidates(scheduler, jobs(1)[0]))
+    # Same seed, the sampled device refuses the job while warming up
+    scheduler, devices = cluster(PowerOfChoices(choices=1, seed=5))
+    warming = devices[[d.name for d in devices].index(first.name)]
+    warming.warm_up()
+    where, left = placements(scheduler, jobs(1))
+    assert left == []
+    assert where[0] != warming.name
+    assert where[0] == next(d.name for d in devices if d is not warming)
+
+
+def test_power_of_choices_needs_a_choice():
+    with pytest.raises(ValueError):
+        PowerOfChoices(choices=0)
+
+
+def test_round_robin_ignores_the_load():
+    scheduler, (p0, p1, p2) = cluster(RoundRobin())
+    queue_jobs(p1, 5)
+    where, left = placements(scheduler, jobs(1, 1, 1, 1))
+    assert left == []
+    assert [where[i] for i in range(4)] == ["P0", "P1", "P2", "P0"]
+
+
+def test_round_robin_skips_a_refusing_device():
+    scheduler, (p0, p1, p2) = cluster(RoundRobin())
+    p1.warm_up()
+    where, _ = placements(scheduler, jobs(1, 1, 1))
+    # P1 refuses the second job, the turn moves on to P2 and back to P0
+    assert [where[i] for i in range(3)] == ["P0", "P2", "P0"]
+
+
+def test_most_headroom_spreads_jobs_ties_to_the_first_added():
+    scheduler, _ = cluster(MostHeadroom(), capacities=(1000, 600, 1000))
+    where, left = placements(scheduler, jobs(300, 300, 300))
+    assert left == []
+    # 1000 / 600 / 1000 -> 700 / 600 / 1000 -> 700 / 600 / 700 -> the first added
+    assert [where[i] for i in range(3)] == ["P0", "P2", "P0"]
+
+
+def test_best_fit_places_the_largest_jobs_first():
+    scheduler, _ = cluster(BestFit(), capacities=(1000, 600, 1000))
+    where, left = placements(scheduler, jobs(200, 500, 700))
+    assert left == []
+    # 700 ties between P0 and P2, 500 fits P1 best, 200 fits the 300 left on P0
+    assert (where[2], where[1], where[0]) == ("P0", "P1", "P0")
+
+
+@pytest.mark.parametrize("policy", [MostHeadroom, BestFit])
+def test_headroom_keeps_jobs_fitting_nowhere_queued(policy):
+    scheduler, (p0, p1) = cluster(policy(), capacities=(1000, 600))
+    queue_jobs(p0, 1, size=200)
+    queued = jobs(900)
+    # The job fits P0 once its queued job leaves, it is not oversized
+    assert scheduler.dispatch.is_blocked(scheduler, queued)
+    where, left = placements(scheduler, queued)
+    assert left == queued
+    assert 0 not in where
+
+
+@pytest.mark.parametrize("policy", [MostHeadroom, BestFit])
+def test_headroom_sends_oversized_jobs_to_the_least_loaded(policy):
+    scheduler, (p0, p1) = cluster(policy(), capacities=(1000, 600))
+    queue_jobs(p0, 1, size=200)
+    queued = jobs(1500, 300)
+    fitting, oversized = policy._placeable_jobs(scheduler, queued, policy._rooms(scheduler))
+    assert [(job, size) for job, size, _ in fitting] == [(queued[1], 300)]
+    assert oversized == [queued[0]]
+
+    assert not scheduler.dispatch.is_blocked(scheduler, queued)
+    where, left = placements(scheduler, queued)
+    assert left == []
+    assert where[0] == "P1"
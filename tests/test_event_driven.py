@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+import main
+import md_main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # The generators read their traces from paths relative to the repository root
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.mark.parametrize("config", [
+    dict(sched_class="FCFS"),
+    dict(sched_class="RR", rr_time_slice=10),
+    dict(sched_class="SRPT", priority_quantum=10, starvation_threshold=100),
+], ids=["FCFS", "RR", "SRPT"])
+def test_main_reports_match_the_step_engine(config):
+    steps = main.main(event_driven=False, seed=0, **config)
+    events = main.main(event_driven=True, seed=0, **config)
+    assert str(events) == str(steps)
+
+
+def test_md_main_reports_match_the_step_engine():
+    steps = md_main.main(event_driven=False)
+    events = md_main.main(event_driven=True)
+    assert str(events) == str(steps)
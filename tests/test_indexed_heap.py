@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from IndexedHeap import IndexedHeap
+
+
+def heap_of(keys: dict) -> IndexedHeap:
+    heap = IndexedHeap()
+    for item, key in keys.items():
+        heap.push(item, key)
+    return heap
+
+
+def test_pop_returns_items_by_key_ties_in_insertion_order():
+    heap = heap_of({"a": 3, "b": 1, "c": 2, "d": 1})
+    assert [heap.pop() for _ in range(4)] == ["b", "d", "c", "a"]
+    with pytest.raises(IndexError):
+        heap.pop()
+
+
+def test_push_rejects_duplicates():
+    heap = heap_of({"a": 1})
+    with pytest.raises(ValueError):
+        heap.push("a", 2)
+
+
+def test_update_moves_items_both_ways():
+    heap = heap_of({"a": 1, "b": 2, "c": 3, "d": 4})
+    heap.update("d", 0)
+    assert heap.peek() == "d"
+    heap.update("d", 10)
+    heap.update("a", 5)
+    assert list(heap.ordered()) == ["b", "c", "a", "d"]
+    assert heap.key("a") == 5
+
+
+def test_update_keeps_the_insertion_order_of_ties():
+    heap = heap_of({"a": 1, "b": 2})
+    heap.update("a", 2)
+    assert heap.rank_key("a") == (2, 0)
+    assert list(heap.ordered()) == ["a", "b"]
+
+
+def test_remove_any_item():
+    heap = heap_of({"a": 5, "b": 1, "c": 4, "d": 2, "e": 3})
+    heap.remove("d")
+    heap.remove("b")
+    assert "d" not in heap and "b" not in heap
+    assert len(heap) == 3
+    assert list(heap.ordered()) == ["e", "c", "a"]
+    with pytest.raises(KeyError):
+        heap.remove("d")
+
+
+def test_ordered_and_smallest_match_a_sort():
+    rng = random.Random(0)
+    keys = {i: rng.randint(0, 20) for i in range(200)}
+    heap = heap_of(keys)
+    for i in range(0, 200, 3):
+        keys[i] = rng.randint(0, 20)
+        heap.update(i, keys[i])
+    for i in range(1, 200, 7):
+        del keys[i]
+        heap.remove(i)
+
+    # Ties keep the insertion order, as a stable sort of the items pushed in order
+    expected = sorted(keys, key=lambda i: keys[i])
+    assert list(heap.ordered()) == expected
+    assert heap.smallest(10) == expected[:10]
+    assert heap.smallest(1000) == expected
+    assert [heap.pop() for _ in range(len(heap))] == expected
+    assert not heap
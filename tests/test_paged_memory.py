@@ -0,0 +1,80 @@
+import pytest
+
+from Clock import StepClock
+from Memory import Memory
+from PagedMemory import PagedMemory
+
+
+def paged(capacity=160, block_size=16):
+    return PagedMemory(StepClock(), capacity=capacity, block_size=block_size)
+
+
+def test_trailing_tokens_are_not_usable():
+    memory = paged(capacity=170)
+    assert memory.num_blocks == 10
+    assert memory.capacity == 160
+    with pytest.raises(ValueError):
+        paged(block_size=0)
+
+
+def test_footprint_rounds_up_to_whole_blocks():
+    memory = paged()
+    assert [memory.footprint(tokens) for tokens in (0, 1, 16, 17, 40)] == [0, 16, 16, 32, 48]
+    assert Memory(StepClock(), capacity=100).footprint(17) == 17
+
+
+def test_cost_counts_only_new_blocks():
+    memory = paged()
+    assert memory._cost(20, "a") == 32
+    assert memory.request(20, owner="a")
+    # 12 tokens left in the last block of "a"
+    assert memory._cost(12, "a") == 0
+    assert memory._cost(13, "a") == 16
+    assert memory._cost(1, "b") == 16
+
+
+def test_blocks_grow_and_shrink_with_their_owner():
+    memory = paged()
+    assert memory.request(20, owner="a")
+    assert memory.request(5, owner="b")
+    assert memory.used_blocks == 3
+    assert memory.occupied_tokens == 48
+    assert memory.reserve(1, owners=["a"] * 12) == 12
+    assert memory.used_blocks == 3
+    assert memory.reserve(1, owners=["a"]) == 1
+    assert memory.used_blocks == 4
+
+    memory.release(20, owner="a")
+    assert len(memory.block_tables["a"]) == 1
+    assert memory.used_blocks == 2
+    memory.release(13, owner="a")
+    memory.release(5, owner="b")
+    assert memory.used_blocks == 0
+    assert memory.block_tables == {} and memory.owner_tokens == {}
+    with pytest.raises(ValueError):
+        memory.release(1, owner="b")
+
+
+def test_internal_fragmentation():
+    memory = paged()
+    assert memory.request(20, owner="a")
+    assert memory.request(5, owner="b")
+    # 12 tokens unused in the last block of "a", 11 in the block of "b"
+    assert memory.internal_fragmentation == 23
+    assert memory.fragmentation_ratio == pytest.approx(23 / 48)
+    assert memory.block_utilization == pytest.approx(3 / 10)
+    memory.release(5, owner="b")
+    assert memory.internal_fragmentation == 12
+    assert memory.peak_fragmentation == 23
+
+
+def test_requests_fail_on_blocks_not_tokens():
+    # 2 blocks left, 10 free tokens in the last block of "a" cannot serve "b"
+    memory = paged(capacity=64)
+    assert memory.request(22, owner="a")
+    assert memory.available_tokens == 32
+    assert not memory.request(33, owner="b")
+    assert memory.allocation_failures == 1
+    assert memory.request(32, owner="b")
+    assert memory.available_tokens == 0
+    assert memory.request(10, owner="a")
@@ -0,0 +1,134 @@
+import pytest
+
+from Clock import StepClock
+from Device import Device
+from Job import Job
+from Preemption import Preemption
+from Schedulers.Batch_prefill import BatchPre
+from Schedulers.Continuous import ContinuousBatching
+from Schedulers.FCFS_prefill import FCFSPre
+
+
+def prefill_device(env, name, preemption=None):
+    return Device(env, name=name, tag=Device.Mode.PREFILL, memory_capacity=10000, memory_kwargs={},
+                  scheduler_cls=FCFSPre, scheduler_kwargs={'chunk_size': 100, 'chunk_time': 2, 'preemption': preemption})
+
+
+def run_steps(env, device, steps):
+    for _ in range(steps):
+        device.step()
+        env.run(until=env.now + 1)
+
+
+def busy_device(env, preemption):
+    """
+    A device prefilling a 500-token prompt, with a prompt started on another device queued behind it.
+    """
+    device = prefill_device(env, "P1", preemption)
+    job = Job(1, arrival_time=0, init_size=500, expected_output=10)
+    pinned = Job(2, arrival_time=0, init_size=300, expected_output=10)
+    pinned.prefill_start_time = 0
+    device.add_job(job)
+    device.add_job(pinned)
+    # The first step starts the prompt, the next two complete its first chunk
+    run_steps(env, device, 3)
+    return device, job
+
+
+def test_in_flight_prompt_moves_with_its_chunks():
+    env = StepClock()
+    preemption = Preemption(Preemption.Mode.SWAP, swap_bandwidth=50)
+    source, job = busy_device(env, preemption)
+    assert source.memory.occupied_tokens == 500
+
+    assert source.scheduler.pick_movable_job([Job.State.INITIAL, Job.State.PREFILL]) is job
+    assert source.scheduler.preempt_job(job)
+    assert job.prefilled_size == 100
+    assert source.memory.occupied_tokens == 0
+    assert source.scheduler.cur_job is None
+    # The 100 prefilled tokens take 2 steps over the link
+    assert job.ready_time == env.now + 2
+    assert preemption.swaps == 1
+
+    target = prefill_device(env, "P2", preemption)
+    assert target.add_job(job)
+    run_steps(env, target, 2)
+    assert target.scheduler.cur_job is None
+    run_steps(env, target, 1)
+    assert target.scheduler.cur_job is job
+    # Only the 4 remaining chunks are prefilled again
+    assert target.scheduler.cur_job_expected_time == 8
+
+
+def test_in_flight_prompt_stays_when_recomputed():
+    env = StepClock()
+    source, job = busy_device(env, Preemption(Preemption.Mode.RECOMPUTE, prefill_rate=100))
+    assert source.scheduler.pick_movable_job([Job.State.INITIAL, Job.State.PREFILL]) is None
+
+
+def test_last_prompt_stays():
+    env = StepClock()
+    device = prefill_device(env, "P1", Preemption(Preemption.Mode.SWAP, swap_bandwidth=50))
+    device.add_job(Job(1, arrival_time=0, init_size=500, expected_output=10))
+    run_steps(env, device, 3)
+    assert device.scheduler.pick_movable_job([Job.State.INITIAL, Job.State.PREFILL]) is None
+
+
+def test_waiting_prompt_moves_first():
+    env = StepClock()
+    device = prefill_device(env, "P1", Preemption(Preemption.Mode.SWAP, swap_bandwidth=50))
+    device.add_job(Job(1, arrival_time=0, init_size=500, expected_output=10))
+    waiting = Job(2, arrival_time=0, init_size=300, expected_output=10)
+    device.add_job(waiting)
+    run_steps(env, device, 3)
+    assert device.scheduler.pick_movable_job([Job.State.INITIAL, Job.State.PREFILL]) is waiting
+
+
+def batch_prefill_device(env, name):
+    return Device(env, name=name, tag=Device.Mode.PREFILL, memory_capacity=10000, memory_kwargs={},
+                  scheduler_cls=BatchPre, scheduler_kwargs={'token_budget': 100})
+
+
+def continuous_device(env, name):
+    return Device(env, name=name, tag=Device.Mode.MIXED, memory_capacity=10000, memory_kwargs={},
+                  scheduler_cls=ContinuousBatching, scheduler_kwargs={'batch': 4, 'token_budget': 100})
+
+
+def moved_prompt(env):
+    """
+    A prompt moved away from a device with its first 100-token chunk, and the device it moves to.
+    """
+    preemption = Preemption(Preemption.Mode.SWAP, swap_bandwidth=50)
+    source, job = busy_device(env, preemption)
+    assert source.scheduler.preempt_job(job)
+    assert job.ready_time == env.now + 2
+    return job
+
+
+def wait_for_tokens(env, target, job):
+    # The prompt waits for its 100 prefilled tokens, without taking memory
+    assert target.add_job(job)
+    for _ in range(2):
+        assert target.step() == []
+        assert target.memory.occupied_tokens == 0
+        env.run(until=env.now + 1)
+
+
+def test_moved_prompt_keeps_its_chunks_on_batch_prefill():
+    env = StepClock()
+    job = moved_prompt(env)
+    target = batch_prefill_device(env, "T1")
+    wait_for_tokens(env, target, job)
+    assert target.step() == [job]
+    assert job.prefilled_size == 100
+    assert target.scheduler.iteration == [(job, 100)]
+
+
+def test_moved_prompt_keeps_its_chunks_on_continuous_batching():
+    env = StepClock()
+    job = moved_prompt(env)
+    target = continuous_device(env, "T1")
+    wait_for_tokens(env, target, job)
+    assert target.step() == [job]
+    # The chunk of the step is accounted right away
+    assert job.prefilled_size == 200
@@ -0,0 +1,58 @@
+from Clock import StepClock
+from Device import Device
+from Job import Job
+from Schedulers.FCFS import FCFS
+
+
+def resident_device(count, size=20, capacity=100):
+    """
+    A device with `count` resident decode jobs of `size` tokens, in run queue order.
+    """
+    env = StepClock()
+    device = Device(env, memory_capacity=capacity, memory_kwargs={}, scheduler_cls=FCFS, scheduler_kwargs={'batch': 1})
+    jobs = []
+    for job_id in range(count):
+        job = Job(job_id, arrival_time=0, init_size=size, expected_output=10)
+        job.state = Job.State.DECODE
+        device.add_job(job)
+        assert device.memory.request(size, owner=job_id)
+        device.scheduler._swap_in(job, size)
+        jobs.append(job)
+    return device, jobs
+
+
+def swapped(jobs):
+    return [job.job_id for job in jobs if job.current_size == 0]
+
+
+def test_victims_come_from_the_back_of_the_run_queue():
+    device, jobs = resident_device(4)
+    assert list(device.scheduler._residents.ordered()) == jobs[::-1]
+    assert device.scheduler._free_memory(50, after=jobs[0])
+    assert swapped(jobs) == [2, 3]
+    assert jobs[3].swap_size == 20
+    assert device.memory.available_tokens == 60
+    assert list(device.scheduler._residents.ordered()) == [jobs[1], jobs[0]]
+
+
+def test_jobs_up_to_after_are_protected():
+    device, jobs = resident_device(4)
+    assert not device.scheduler._free_memory(80, after=jobs[2])
+    # The only victim is swapped out even if it cannot free enough memory
+    assert swapped(jobs) == [3]
+
+
+def test_restoring_jobs_are_pinned():
+    device, jobs = resident_device(4)
+    jobs[3].ready_time = device.env.now + 5
+    assert device.scheduler._free_memory(50, after=jobs[0])
+    assert swapped(jobs) == [1, 2]
+
+
+def test_victim_order_follows_the_run_queue():
+    device, jobs = resident_device(4)
+    # The head goes to the back of the queue, and becomes the first victim
+    device.scheduler.run_queue.rotate(1)
+    device.scheduler._reorder_resident(jobs[0])
+    assert device.scheduler._free_memory(40, after=jobs[1])
+    assert swapped(jobs) == [0]
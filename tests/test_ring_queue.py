@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import pytest
+
+from RingQueue import RingQueue
+
+
+def items(*ids):
+    return [SimpleNamespace(job_id=i) for i in ids]
+
+
+def ids(queue):
+    return [item.job_id for item in queue]
+
+
+def test_rotate_moves_the_head_to_the_back():
+    queue = RingQueue(items(1, 2, 3, 4))
+    moved = queue.rotate(1)
+    assert ids(moved) == [1]
+    assert ids(queue) == [2, 3, 4, 1]
+    assert ids(queue.rotate(2)) == [2, 3]
+    assert ids(queue) == [4, 1, 2, 3]
+
+
+def test_rotate_wraps_around():
+    queue = RingQueue(items(1, 2, 3))
+    assert queue.rotate(3) == []
+    assert ids(queue) == [1, 2, 3]
+    queue.rotate(7)
+    assert ids(queue) == [2, 3, 1]
+    assert RingQueue().rotate(1) == []
+
+
+def test_order_follows_rotations():
+    queue = RingQueue(items(1, 2, 3))
+    first, second, third = list(queue)
+    queue.rotate(1)
+    assert queue.order(second) < queue.order(third) < queue.order(first)
+
+
+def test_remove_by_item_and_key():
+    queue = RingQueue(items(1, 2, 3, 4))
+    third = queue[2]
+    queue.remove(third)
+    assert queue.pop_key(1).job_id == 1
+    assert ids(queue) == [2, 4]
+    assert third not in queue
+    assert not queue.contains_key(1)
+    with pytest.raises(ValueError):
+        queue.pop_key(1)
+    with pytest.raises(ValueError):
+        queue.remove(third)
+
+
+def test_append_rejects_duplicate_keys():
+    queue = RingQueue(items(1))
+    with pytest.raises(ValueError):
+        queue.append(SimpleNamespace(job_id=1))
+
+
+def test_indexes_and_head():
+    queue = RingQueue(items(1, 2, 3, 4, 5))
+    assert [queue[i].job_id for i in range(5)] == [1, 2, 3, 4, 5]
+    assert queue[-1].job_id == 5
+    assert ids(queue.head(2)) == [1, 2]
+    assert ids(reversed(queue)) == [5, 4, 3, 2, 1]
+    with pytest.raises(IndexError):
+        queue[5]
+    assert queue.popleft().job_id == 1
+    assert len(queue) == 4
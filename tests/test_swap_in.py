@@ -0,0 +1,40 @@
+import pytest
+
+from Clock import StepClock
+from Device import Device
+from Job import Job
+from Schedulers.RR import RR
+from Schedulers.SRPT import SRPT
+
+
+SCHEDULERS = [
+    (RR, {'batch': 4}),
+    (SRPT, {'batch': 4, 'priority_quantum': None, 'starvation_threshold': None}),
+]
+
+
+def decode_job(job_id, init_size, expected_output=100, **kwargs):
+    job = Job(job_id, arrival_time=0, init_size=init_size, expected_output=expected_output, **kwargs)
+    job.state = Job.State.DECODE
+    return job
+
+
+@pytest.mark.parametrize("scheduler_cls, scheduler_kwargs", SCHEDULERS)
+def test_failed_swap_in_waits(scheduler_cls, scheduler_kwargs):
+    # 4 blocks of 16 tokens, a resident job holds 3 of them
+    env = StepClock()
+    device = Device(env, memory_capacity=64, memory_kwargs={'block_size': 16},
+                    scheduler_cls=scheduler_cls, scheduler_kwargs=scheduler_kwargs)
+    resident = decode_job(1, init_size=40)
+    device.add_job(resident)
+    device.step()
+
+    # 16 tokens fit in the last free block, but an uncached prefix takes a block of its own
+    job = decode_job(2, init_size=16, prefix_id=7, prefix_size=8)
+    device.add_job(job)
+    env.run(until=1)
+    device.step()
+
+    assert job.current_size == 0
+    assert device.memory.occupied_tokens == 48
+    assert device.scheduler.committed_tokens == resident.current_size
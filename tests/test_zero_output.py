@@ -0,0 +1,47 @@
+import pytest
+
+from Allocator import Allocator
+from Clock import StepClock
+from Device import Device
+from Generators.Random import RandomGenerator
+from Schedulers.Continuous import ContinuousBatching
+from Schedulers.FCFS import FCFS
+from Schedulers.FCFS_prefill import FCFSPre
+from Schedulers.GlobalScheduler import GlobalScheduler
+from System import System
+
+
+def mixed_cluster(env):
+    return [Device(env, name="Mixed_1", tag=Device.Mode.MIXED, memory_capacity=10000, memory_kwargs={},
+                   scheduler_cls=ContinuousBatching, scheduler_kwargs={'batch': 4, 'token_budget': 64})]
+
+
+def disaggregated_cluster(env):
+    return [
+        Device(env, name="Prefill_1", tag=Device.Mode.PREFILL, memory_capacity=10000, memory_kwargs={},
+               scheduler_cls=FCFSPre, scheduler_kwargs={'chunk_size': 64, 'chunk_time': 1}),
+        Device(env, name="Decode_1", tag=Device.Mode.DECODE, memory_capacity=10000, memory_kwargs={},
+               scheduler_cls=FCFS, scheduler_kwargs={'batch': 4}),
+    ]
+
+
+@pytest.mark.parametrize("cluster", [mixed_cluster, disaggregated_cluster])
+def test_zero_output_jobs_finish_with_their_prefill(cluster):
+    env = StepClock()
+    devices = cluster(env)
+    global_sched = GlobalScheduler(devices=list(devices))
+    allocator = Allocator(global_scheduler=global_sched, all_devices=list(devices), idle_threshold=-1)
+    # Every other job has no output to generate
+    outputs = iter([0, 5] * 5)
+    generator = RandomGenerator(env, scheduler=global_sched, speed=0.5, total=10, dropout=0.0,
+                                init_fn=lambda rng: 100, output_fn=lambda rng: next(outputs), seed=0)
+    system = System(env, tasks_generator=generator, global_scheduler=global_sched, devices_allocator=allocator)
+    env.process(system.run_simulation(max_time=1000))
+    env.run()
+
+    assert len(system.completed_jobs) == 10
+    for job in system.completed_jobs:
+        assert job.decode_start_time is not None
+        assert job.prefill_finish_time <= job.decode_start_time <= job.decode_finish_time
+    report = system.report_stats()
+    assert report.finished_jobs == 10